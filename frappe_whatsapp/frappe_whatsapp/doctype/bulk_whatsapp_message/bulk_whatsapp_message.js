@@ -53,6 +53,34 @@ frappe.ui.form.on("Bulk WhatsApp Message", {
                     },
                 })
             }).addClass("btn-danger")
+
+            let call_action = function (method) {
+                frappe.call({
+                    method: "frappe_whatsapp.utils.bulk_messaging." + method,
+                    args: {
+                        name: frm.doc.name,
+                    },
+                    callback: function (r) {
+                        if (r.message) {
+                            frm.reload_doc()
+                        }
+                    },
+                })
+            }
+
+            if (["Queued", "In Progress"].includes(frm.doc.status)) {
+                frm.add_custom_button(__("Pause"), () => call_action("pause"), __("Sending"))
+            }
+            if (frm.doc.status == "Paused") {
+                frm.add_custom_button(__("Resume"), () => call_action("resume"), __("Sending"))
+            }
+            if (["Queued", "In Progress", "Paused"].includes(frm.doc.status)) {
+                frm.add_custom_button(
+                    __("Cancel Sending"),
+                    () => frappe.confirm(__("Stop this campaign and drop its unsent messages?"), () => call_action("cancel")),
+                    __("Sending")
+                )
+            }
         }
     },
     validate: function (frm) {
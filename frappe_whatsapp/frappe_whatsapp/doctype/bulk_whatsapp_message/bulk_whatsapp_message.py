@@ -1,13 +1,28 @@
 # Bulk WhatsApp Messaging for Frappe WhatsApp
 # bulk_whatsapp_messaging.py
 
+import datetime
+import math
+
 import frappe
 from frappe import _
-import json
-from frappe.utils import cint, get_datetime, now
+from frappe.utils import add_to_date, cint, get_datetime, get_time, now, now_datetime
 from frappe.model.document import Document
 from frappe.model.naming import make_autoname
 
+from frappe_whatsapp.utils import campaign_scheduler, dispatcher
+from frappe_whatsapp.utils.media_cache import get_cached_media
+from frappe_whatsapp.utils.message_store import bulk_insert_messages
+from frappe_whatsapp.utils.templating import (
+    UNDEFINED_SAMPLE_SIZE,
+    find_undefined_variables,
+    get_variables,
+    render_many,
+)
+
+CHUNK_SIZE = 500
+RETRY_BATCH_SIZE = 1000
+
 # Add these files to your frappe_whatsapp app
 
 # 1. First, create a new DocType for Bulk WhatsApp Messaging
@@ -40,90 +55,348 @@ class BulkWhatsAppMessage(Document):
         elif self.recipients:
             self.recipient_count = len(self.recipients)
     
+    def before_submit(self):
+        self.validate_template_variables()
+
+    def validate_template_variables(self):
+        """Fail before sending when a placeholder is not defined by any recipient"""
+        if not get_variables(self.message_content):
+            return
+
+        # Leading recipients are representative for imported lists, all share the same data fields
+        sample = self.get_recipients(limit=UNDEFINED_SAMPLE_SIZE, fields=["recipient_data"])
+        undefined = find_undefined_variables(self.message_content, sample)
+        if undefined:
+            frappe.throw(_("Variables {0} are not defined in the recipient data").format(
+                ", ".join(f"{{{{{variable}}}}}" for variable in undefined)
+            ))
+    
     def on_submit(self):
         self.db_set("status", "Queued")
-        self.queue_messages()
-    
-    def queue_messages(self):
-        """Queue messages for sending"""
-        if self.recipient_type == 'Recipient List' and self.recipient_list:
-            # Fetch recipients from the recipient list
-            recipients = frappe.get_all(
-                "WhatsApp Recipient", 
-                filters={"parent": self.recipient_list},
-                fields=["mobile_number", "name", "recipient_name", "recipient_data"]
+        if self.attach and not self.attach.startswith("http"):
+            # Read the attachment once so every recipient reuses the cached payload
+            get_cached_media(self.attach)
+
+        if self.scheduled_time and get_datetime(self.scheduled_time) > now_datetime():
+            campaign_scheduler.schedule(self.name, self.scheduled_time)
+        else:
+            frappe.enqueue_doc(
+                self.doctype, self.name,
+                "release_batch",
+                "long", 4000,
+                enqueue_after_commit=True
             )
-            
-            for recipient in recipients:
-                frappe.enqueue_doc(
-                    self.doctype, self.name,
-                    "create_single_message",
-                    "long", 4000,
-                    recipient=recipient
-                )
+
+    def on_cancel(self):
+        campaign_scheduler.unschedule(self.name)
+
+    def release_batch(self):
+        """Release recipients after the cursor as chunks and schedule the next paced batch"""
+        if self.status not in ("Queued", "In Progress"):
+            return
+
+        next_window = self.get_next_window_start()
+        if next_window:
+            campaign_scheduler.schedule(self.name, next_window)
+            return
+
+        batch_size = self.get_batch_size()
+        released = 0
+        while not batch_size or released < batch_size:
+            limit = min(CHUNK_SIZE, batch_size - released) if batch_size else CHUNK_SIZE
+            recipients = self.get_recipients(after=self.last_recipient, limit=limit, fields=["name"])
+            if not recipients:
+                # Everything is released; the list may have changed since submit
+                self.db_set("recipient_count", cint(self.released_count))
+                close_if_finished(self.name)
+                return
+
+            self.add_chunk(recipients)
+            released += len(recipients)
+            self.db_set({
+                "last_recipient": recipients[-1].name,
+                "released_count": cint(self.released_count) + len(recipients),
+                "status": "In Progress",
+            })
+            frappe.db.commit()
+
+            if frappe.db.get_value(self.doctype, self.name, "status") != "In Progress":
+                # Paused or cancelled while releasing
+                return
+
+        campaign_scheduler.schedule(self.name, add_to_date(now_datetime(), minutes=1))
+
+    def get_batch_size(self):
+        """Recipients released per minute, None to release everything at once"""
+        if cint(self.send_rate):
+            return cint(self.send_rate)
+        if cint(self.spread_over):
+            return max(1, math.ceil(cint(self.recipient_count) / cint(self.spread_over)))
+        return None
+
+    def get_next_window_start(self):
+        """Start of the next sending window, None while inside the window"""
+        if not self.window_start or not self.window_end:
+            return None
+
+        now = now_datetime()
+        start, end, current = get_time(self.window_start), get_time(self.window_end), now.time()
+        if start <= end:
+            inside = start <= current < end
         else:
-            # Use recipients from the current document
-            for recipient in self.recipients:
-                frappe.enqueue_doc(
-                    self.doctype, self.name,
-                    "create_single_message",
-                    "long", 4000,
-                    recipient=recipient
-                )
-    
+            # Window spans midnight
+            inside = current >= start or current < end
+
+        if inside:
+            return None
+
+        next_start = datetime.datetime.combine(now.date(), start)
+        if next_start <= now:
+            next_start += datetime.timedelta(days=1)
+        return next_start
+
+    def get_recipients(self, after=None, limit=None, fields=None, start=None, until=None):
+        """Get recipients in name order, starting after the `after` cursor"""
+        if self.recipient_type == 'Recipient List' and self.recipient_list:
+            filters = [["parent", "=", self.recipient_list], ["parenttype", "=", "WhatsApp Recipient List"]]
+        else:
+            filters = [["parent", "=", self.name], ["parenttype", "=", self.doctype]]
+
+        if after:
+            filters.append(["name", ">", after])
+        if start:
+            filters.append(["name", ">=", start])
+        if until:
+            filters.append(["name", "<=", until])
+
+        return frappe.get_all(
+            "WhatsApp Recipient",
+            filters=filters,
+            fields=fields or ["mobile_number", "name", "recipient_name", "recipient_data"],
+            order_by="name asc",
+            limit_page_length=limit or 0
+        )
+
+    def add_chunk(self, recipients):
+        """Persist chunk state for a range of recipients and queue it"""
+        chunk = self.append("chunks", {
+            "first_recipient": recipients[0].name,
+            "last_recipient": recipients[-1].name,
+            "recipient_count": len(recipients),
+            "status": "Queued",
+        })
+        chunk.db_insert()
+        frappe.db.sql(
+            """update `tabBulk WhatsApp Message`
+            set chunk_count = chunk_count + 1 where name = %s""",
+            self.name,
+        )
+        self.enqueue_chunk(chunk.name)
+
+    def enqueue_chunk(self, chunk):
+        frappe.enqueue_doc(
+            self.doctype, self.name,
+            "process_chunk",
+            "long", 4000,
+            enqueue_after_commit=True,
+            chunk=chunk
+        )
+
+    def process_chunk(self, chunk):
+        """Create the messages of one chunk exactly once"""
+        row = frappe.db.get_value(
+            "Bulk WhatsApp Message Chunk", chunk,
+            ["status", "first_recipient", "last_recipient"],
+            as_dict=True, for_update=True
+        )
+        if not row or row.status != "Queued":
+            return
+
+        if frappe.db.get_value(self.doctype, self.name, "status") != "In Progress":
+            return
+
+        recipients = self.get_recipients(start=row.first_recipient, until=row.last_recipient)
+        names = self.create_messages(recipients, chunk)
+        frappe.db.set_value("Bulk WhatsApp Message Chunk", chunk, {
+            "status": "Released",
+            "pending_count": len(names),
+        })
+
+        if not names:
+            # Recipients were removed after release, nothing will report back
+            report_chunks({chunk: (0, 0)})
+
     def create_single_message(self, recipient):
         """Create a single message in the queue"""
-        self.status == "In Progress"
-        
-        message_content = self.message_content or ""
-        
-        if recipient.get("recipient_data"):
-            try:
-                variables = json.loads(recipient.get("recipient_data", "{}"))
-                for var_name, var_value in variables.items():
-                    message_content = message_content.replace(f"{{{{{var_name}}}}}", str(var_value))
-            except Exception as e:
-                frappe.log_error(f"Error parsing recipient data: {str(e)}", "WhatsApp Bulk Messaging")
-        
-        wa_message = frappe.new_doc("WhatsApp Message")
-        wa_message.to = recipient.get("mobile_number")
-        wa_message.message_type = "Manual"
-        wa_message.message = message_content
-        wa_message.content_type = self.content_type or "text"
-        wa_message.bulk_message_reference = self.name
-        
-        if self.attach:
-            wa_message.attach = self.attach
-        
-        wa_message.status = "Queued"
-        try:
-            wa_message.insert(ignore_permissions=True)
-        except Exception:
-            self.db_set("status", "Partially Failed")
-        
-        self.db_set("sent_count", cint(self.sent_count) + 1)
-        if self.recipient_count == self.sent_count:
-            self.db_set("status", "Completed")
+        self.create_messages([recipient])
 
-    def retry_failed(self):
-        """Retry failed messages"""
-        failed_messages = frappe.get_all(
-            "WhatsApp Message",
-            filters={
-                "bulk_message_reference": self.name,
-                "status": "Failed"
-            },
-            fields=["name"]
+    def create_messages(self, recipients, chunk=None):
+        """Persist a chunk of messages in one insert and hand them to the marketing lane"""
+        contents = render_many(self.message_content, recipients)
+        names = bulk_insert_messages([
+            self.make_message(recipient, chunk, content)
+            for recipient, content in zip(recipients, contents)
+        ])
+        dispatcher.push(names, "Marketing")
+
+        frappe.db.sql(
+            """update `tabBulk WhatsApp Message`
+            set sent_count = sent_count + %s where name = %s""",
+            (len(names), self.name),
         )
-        
+        return names
+
+    def make_message(self, recipient, chunk=None, message_content=None):
+        """Build the outgoing message row for one recipient"""
+        if message_content is None:
+            message_content = render_many(self.message_content, [recipient])[0]
+
+        return {
+            "type": "Outgoing",
+            "to": recipient.get("mobile_number"),
+            "message_type": "Manual",
+            "message": message_content,
+            "content_type": self.content_type or "text",
+            "attach": self.attach,
+            "bulk_message_reference": self.name,
+            "bulk_message_chunk": chunk,
+            "priority": "Marketing",
+            "status": "Queued",
+        }
+
+    def reconcile(self):
+        """Restart lost work or close the campaign from message statuses"""
+        if campaign_scheduler.is_scheduled(self.name):
+            return
+
+        if cint(self.released_count) < cint(self.recipient_count):
+            frappe.enqueue_doc(self.doctype, self.name, "release_batch", "long", 4000)
+            return
+
+        queued_chunks = [chunk.name for chunk in self.chunks if chunk.status == "Queued"]
+        for chunk in queued_chunks:
+            self.enqueue_chunk(chunk)
+        if queued_chunks:
+            return
+
+        if frappe.db.exists("WhatsApp Message", {"bulk_message_reference": self.name, "status": "Queued"}):
+            # Their chunk reports close the campaign once sent, unless Redis lost them
+            dispatcher.requeue_stale(self.name)
+            return
+
+        failed_count = frappe.db.count("WhatsApp Message", {
+            "bulk_message_reference": self.name,
+            "status": "Failed"
+        })
+        self.db_set({
+            "failed_count": failed_count,
+            "status": "Partially Failed" if failed_count else "Completed",
+        })
+
+    def pause(self):
+        """Stop releasing recipients and sending queued messages"""
+        if self.status not in ("Queued", "In Progress"):
+            frappe.throw(_("Only queued or running campaigns can be paused"))
+
+        self.db_set("status", "Paused")
+        campaign_scheduler.unschedule(self.name)
+
+    def resume(self):
+        """Continue from the persisted cursor without re-reading released recipients"""
+        if self.status != "Paused":
+            frappe.throw(_("Only paused campaigns can be resumed"))
+
+        self.db_set("status", "In Progress")
+
+        # Messages already created but dropped from the lane while paused
+        last_name = None
+        while True:
+            filters = {"bulk_message_reference": self.name, "status": "Queued"}
+            if last_name:
+                filters["name"] = [">", last_name]
+            names = frappe.get_all("WhatsApp Message", filters=filters, order_by="name asc", limit=CHUNK_SIZE, pluck="name")
+            if not names:
+                break
+            dispatcher.push(names, "Marketing")
+            last_name = names[-1]
+
+        for chunk in self.chunks:
+            if chunk.status == "Queued":
+                self.enqueue_chunk(chunk.name)
+
+        frappe.enqueue_doc(
+            self.doctype, self.name,
+            "release_batch",
+            "long", 4000,
+            enqueue_after_commit=True
+        )
+
+    def cancel_sending(self):
+        """Stop the campaign for good and drop its unsent messages"""
+        if self.status not in ("Queued", "In Progress", "Paused"):
+            frappe.throw(_("Only unfinished campaigns can be cancelled"))
+
+        self.db_set("status", "Cancelled")
+        campaign_scheduler.unschedule(self.name)
+        frappe.db.sql(
+            """update `tabWhatsApp Message` set status = 'Cancelled'
+            where bulk_message_reference = %s and status = 'Queued'""",
+            self.name,
+        )
+
+    def retry_failed(self):
+        """Re-queue failed messages in keyset batches with exponential backoff"""
+        settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
+        max_attempts = cint(settings.max_send_attempts) or 5
+        backoff = cint(settings.retry_backoff) or 60
+
         count = 0
-        for msg in failed_messages:
-            message_doc = frappe.get_doc("WhatsApp Message", msg.name)
-            message_doc.status = "Queued"
-            message_doc.save(ignore_permissions=True)
-            count += 1
-        
-        frappe.msgprint(_("{0} messages have been requeued for sending").format(count))
+        last_name = None
+        while True:
+            filters = {
+                "bulk_message_reference": self.name,
+                "status": "Failed",
+                "attempts": ["<", max_attempts],
+            }
+            if last_name:
+                filters["name"] = [">", last_name]
+
+            failed = frappe.get_all(
+                "WhatsApp Message",
+                filters=filters,
+                fields=["name", "attempts"],
+                order_by="name asc",
+                limit=RETRY_BATCH_SIZE
+            )
+            if not failed:
+                break
+
+            if not count and self.status in ("Completed", "Partially Failed"):
+                self.db_set("status", "In Progress")
+
+            by_attempts = {}
+            for row in failed:
+                by_attempts.setdefault(cint(row.attempts), []).append(row.name)
+
+            frappe.db.sql(
+                """update `tabBulk WhatsApp Message`
+                set pending_retries = pending_retries + %s where name = %s""",
+                (len(failed), self.name),
+            )
+
+            for attempts, names in by_attempts.items():
+                frappe.db.sql(
+                    """update `tabWhatsApp Message` set status = 'Queued'
+                    where name in %s and status = 'Failed'""",
+                    (names,),
+                )
+                dispatcher.push(names, "Marketing", delay=backoff * 2 ** max(attempts - 1, 0))
+
+            frappe.db.commit()
+            count += len(failed)
+            last_name = failed[-1].name
+
+        return count
         
     def get_progress(self):
         """Get sending progress for this bulk message"""
@@ -148,3 +421,78 @@ class BulkWhatsAppMessage(Document):
             "queued": queued,
             "percent": (sent / total * 100) if total else 0
         }
+
+
+def report_chunks(chunks):
+    """Record sent and failed messages per chunk, closing chunks and campaigns that finish
+
+    `chunks` maps a chunk name to a (sent, failed) tuple of messages handled
+    since the last report.
+    """
+    finished = set()
+    for chunk, (sent, failed) in chunks.items():
+        frappe.db.sql(
+            """update `tabBulk WhatsApp Message Chunk`
+            set pending_count = pending_count - %s, failed_count = failed_count + %s
+            where name = %s""",
+            (sent + failed, failed, chunk),
+        )
+        row = frappe.db.get_value(
+            "Bulk WhatsApp Message Chunk", chunk,
+            ["parent", "status", "pending_count", "failed_count"],
+            as_dict=True, for_update=True
+        )
+        if not row or row.status != "Released" or row.pending_count > 0:
+            continue
+
+        frappe.db.set_value("Bulk WhatsApp Message Chunk", chunk, "status", "Completed")
+        frappe.db.sql(
+            """update `tabBulk WhatsApp Message`
+            set completed_chunks = completed_chunks + 1, failed_count = failed_count + %s,
+            modified = %s where name = %s""",
+            (row.failed_count, now(), row.parent),
+        )
+        finished.add(row.parent)
+
+    for name in finished:
+        close_if_finished(name)
+
+
+def report_retries(retries):
+    """Record retried messages per campaign as a (sent, recovered) tuple"""
+    for name, (sent, recovered) in retries.items():
+        frappe.db.sql(
+            """update `tabBulk WhatsApp Message`
+            set pending_retries = greatest(pending_retries - %s, 0),
+            failed_count = greatest(failed_count - %s, 0), modified = %s
+            where name = %s""",
+            (sent, recovered, now(), name),
+        )
+        close_if_finished(name)
+
+
+def close_if_finished(name):
+    """Complete a campaign once every recipient is released and every chunk has reported"""
+    bulk = frappe.db.get_value(
+        "Bulk WhatsApp Message", name,
+        ["status", "recipient_count", "released_count", "chunk_count", "completed_chunks", "pending_retries", "failed_count"],
+        as_dict=True
+    )
+    if not bulk or bulk.status not in ("Queued", "In Progress"):
+        return
+
+    if (
+        cint(bulk.released_count) < cint(bulk.recipient_count)
+        or cint(bulk.completed_chunks) < cint(bulk.chunk_count)
+        or cint(bulk.pending_retries) > 0
+    ):
+        return
+
+    frappe.db.set_value(
+        "Bulk WhatsApp Message", name,
+        "status", "Partially Failed" if cint(bulk.failed_count) else "Completed"
+    )
+
+
+def on_doctype_update():
+    frappe.db.add_index("Bulk WhatsApp Message", ["status", "modified"])
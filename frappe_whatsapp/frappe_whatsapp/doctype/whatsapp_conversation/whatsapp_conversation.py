@@ -0,0 +1,13 @@
+# Copyright (c) 2026, Shridhar Patil and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class WhatsAppConversation(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("WhatsApp Conversation", ["last_message_at"])
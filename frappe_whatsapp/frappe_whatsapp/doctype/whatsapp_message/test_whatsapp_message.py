@@ -3,10 +3,20 @@
 # See license.txt
 
 # import frappe
-from frappe.tests import UnitTestCase
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from frappe_whatsapp.utils.query_plans import get_missing_indexes
 
 
 class TestWhatsAppMessage(UnitTestCase):
     """Test whatsapp messages."""
 
     pass
+
+
+class TestWhatsAppMessageQueryPlans(IntegrationTestCase):
+    """Test hot queries use an index."""
+
+    def test_hot_queries_use_an_index(self):
+        # Plans on a near-empty table may still scan, only check the index is usable
+        self.assertEqual(get_missing_indexes(), [])
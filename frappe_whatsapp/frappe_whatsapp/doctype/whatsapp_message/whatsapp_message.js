@@ -12,7 +12,9 @@ frappe.ui.form.on('WhatsApp Message', {
 	refresh: function(frm) {
 		if (frm.doc.type == 'Incoming'){
 			frm.add_custom_button(__("Reply"), function(){
-				frappe.new_doc("WhatsApp Message", {"to": frm.doc.from});
+				// Senders are international numbers without the '+', keep the default country code off them
+				let to = frm.doc.from.startsWith('+') ? frm.doc.from : '+' + frm.doc.from;
+				frappe.new_doc("WhatsApp Message", {"to": to});
 
 			});
 		}
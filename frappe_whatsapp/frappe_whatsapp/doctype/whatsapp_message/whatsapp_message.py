@@ -2,78 +2,95 @@
 # For license information, please see license.txt
 import json
 import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.utils import cint, now_datetime
 import requests
 
+from frappe_whatsapp.frappe_whatsapp.doctype.bulk_whatsapp_message.bulk_whatsapp_message import (
+    report_chunks,
+    report_retries,
+)
+from frappe_whatsapp.utils import contacts, conversations, dispatcher, phone, phone_index
+from frappe_whatsapp.utils.log_writer import log
+from frappe_whatsapp.utils.media_cache import get_media_file
+from frappe_whatsapp.utils.message_store import bulk_insert_messages
+
+BATCH_CONTENT_TYPES = ("text", "image", "video", "audio", "document")
+MAX_BATCH_SIZE = 1000
+
 
 class WhatsAppMessage(Document):
     """Send WhatsApp messages using WAHA API."""
 
     def before_insert(self):
         """Send message."""
-        if self.type == "Outgoing":
-            if self.attach and not self.attach.startswith("http"):
-                link = frappe.utils.get_url() + "/" + self.attach
-            else:
-                link = self.attach
+        if not self.conversation_id:
+            self.conversation_id = conversations.get_conversation_id(self)
 
-            data = {
-                "session": self.get_session_name(),
-                "chatId": self.format_number(self.to),
-            }
-            
-            if self.is_reply and self.reply_to_message_id:
-                data["reply_to"] = self.reply_to_message_id
-            
-            if self.content_type == "text":
-                data["text"] = self.message
-                self.send_text(data)
-            elif self.content_type == "image":
-                data["file"] = {
-                    "mimetype": "image/jpeg",
-                    "url": link,
-                    "filename": "image.jpeg"
-                }
-                if self.message:
-                    data["caption"] = self.message
-                self.send_image(data)
-            elif self.content_type == "video":
-                data["file"] = {
-                    "mimetype": "video/mp4",
-                    "url": link,
-                    "filename": "video.mp4"
-                }
-                if self.message:
-                    data["caption"] = self.message
-                self.send_video(data)
-            elif self.content_type == "audio":
-                data["file"] = {
-                    "mimetype": "audio/ogg; codecs=opus",
-                    "url": link
-                }
-                self.send_voice(data)
-            elif self.content_type == "document":
-                data["file"] = {
-                    "url": link,
-                    "filename": "document.pdf"
-                }
-                if self.message:
-                    data["caption"] = self.message
-                self.send_file(data)
-            elif self.content_type == "reaction":
-                data["messageId"] = self.reply_to_message_id
-                data["reaction"] = self.message
-                self.send_reaction(data)
-            elif self.content_type == "location":
-                location_data = json.loads(self.message) if isinstance(self.message, str) else self.message
-                data["latitude"] = location_data.get("latitude")
-                data["longitude"] = location_data.get("longitude")
-                data["title"] = location_data.get("title", "")
-                self.send_location(data)
-            elif self.content_type == "contact":
-                contact_data = json.loads(self.message) if isinstance(self.message, str) else self.message
-                data["contacts"] = contact_data if isinstance(contact_data, list) else [contact_data]
-                self.send_contact(data)
+        if self.type == "Incoming" and not self.reference_doctype:
+            self.link_to_record()
+
+        if self.type == "Outgoing" and not self.flags.skip_send:
+            self.send()
+            dispatcher.consume(1)
+
+    def after_insert(self):
+        conversations.touch([self])
+        contacts.record([self])
+
+    def link_to_record(self):
+        """Link an incoming message to the record its number is indexed for."""
+        record = phone_index.lookup(self.get("from"), international=True)
+        if record:
+            self.reference_doctype = record.reference_doctype
+            self.reference_name = record.reference_name
+
+    def send(self):
+        """Build WAHA payload for the content type and send it."""
+        data = {
+            "session": self.get_session_name(),
+            "chatId": self.format_number(self.to),
+        }
+        
+        if self.is_reply and self.reply_to_message_id:
+            data["reply_to"] = self.reply_to_message_id
+        
+        if self.content_type == "text":
+            data["text"] = self.message
+            self.send_text(data)
+        elif self.content_type == "image":
+            data["file"] = get_media_file(self.attach, "image/jpeg", "image.jpeg")
+            if self.message:
+                data["caption"] = self.message
+            self.send_image(data)
+        elif self.content_type == "video":
+            data["file"] = get_media_file(self.attach, "video/mp4", "video.mp4")
+            if self.message:
+                data["caption"] = self.message
+            self.send_video(data)
+        elif self.content_type == "audio":
+            data["file"] = get_media_file(self.attach, "audio/ogg; codecs=opus")
+            self.send_voice(data)
+        elif self.content_type == "document":
+            data["file"] = get_media_file(self.attach, filename="document.pdf")
+            if self.message:
+                data["caption"] = self.message
+            self.send_file(data)
+        elif self.content_type == "reaction":
+            data["messageId"] = self.reply_to_message_id
+            data["reaction"] = self.message
+            self.send_reaction(data)
+        elif self.content_type == "location":
+            location_data = json.loads(self.message) if isinstance(self.message, str) else self.message
+            data["latitude"] = location_data.get("latitude")
+            data["longitude"] = location_data.get("longitude")
+            data["title"] = location_data.get("title", "")
+            self.send_location(data)
+        elif self.content_type == "contact":
+            contact_data = json.loads(self.message) if isinstance(self.message, str) else self.message
+            data["contacts"] = contact_data if isinstance(contact_data, list) else [contact_data]
+            self.send_contact(data)
 
     def send_text(self, data):
         """Send text message."""
@@ -195,25 +212,19 @@ class WhatsAppMessage(Document):
                 except:
                     error_msg = e.response.text or error_msg
             
-            frappe.get_doc({
-                "doctype": "WhatsApp Notification Log",
-                "template": "Text Message",
-                "meta_data": json.dumps({"error": error_msg, "data": data})
-            }).insert(ignore_permissions=True)
+            log("Text Message", {"error": error_msg, "data": data}, error=True)
             
             raise Exception(error_msg)
 
+    def get_chat_id(self):
+        """ChatId of the other party; incoming senders come from a chatId and are international."""
+        if self.type == "Incoming" and self.get("from"):
+            return self.format_number(phone.from_chat_id(self.get("from")) or self.get("from"))
+        return self.format_number(self.get("from") or self.to)
+
     def format_number(self, number):
         """Format number to WAHA chatId format (add @c.us suffix)."""
-        if number.startswith("+"):
-            number = number[1:]
-        
-        number = number.replace(" ", "").replace("-", "")
-        
-        if not number.endswith("@c.us") and not number.endswith("@g.us"):
-            number = f"{number}@c.us"
-        
-        return number
+        return phone.to_chat_id(number)
 
     def get_session_name(self):
         """Get session name from settings."""
@@ -228,21 +239,94 @@ class WhatsAppMessage(Document):
         
         data = {
             "session": self.get_session_name(),
-            "chatId": self.format_number(self.get("from") or self.to)
+            "chatId": self.get_chat_id()
         }
         
         try:
             response = self.make_waha_request("/api/sendSeen", data)
             self.status = "marked as read"
             self.save()
+            conversations.mark_read(self.conversation_id)
             return True
         except Exception as e:
             frappe.log_error("WhatsApp API Error", f"Failed to send read receipt: {str(e)}")
             return False
 
 
+def send_queued_messages(names):
+    """Send persisted outgoing messages and record the outcome on each row."""
+    bulk_messages = {}
+    chunks = {}
+    retries = {}
+    for name in names:
+        # Lock the row: a message re-pushed by the stale sweep may be in two jobs
+        doc = frappe.get_doc("WhatsApp Message", name, for_update=True)
+        if doc.status != "Queued":
+            continue
+
+        if doc.bulk_message_reference:
+            if doc.bulk_message_reference not in bulk_messages:
+                bulk_messages[doc.bulk_message_reference] = frappe.db.get_value(
+                    "Bulk WhatsApp Message", doc.bulk_message_reference, "status"
+                )
+            if bulk_messages[doc.bulk_message_reference] in ("Paused", "Cancelled"):
+                # Left Queued; resuming the campaign puts it back in its lane
+                continue
+
+        error = None
+        try:
+            if phone.number_exists(doc.to):
+                doc.send()
+            else:
+                doc.status = "Failed"
+                error = _("{0} is not on WhatsApp").format(doc.to)
+        except Exception as e:
+            doc.status = "Failed"
+            error = str(e)
+
+        attempts = cint(doc.attempts) + 1
+        attempt_log = frappe.parse_json(doc.attempt_log) or []
+        attempt_log.append({
+            "attempt": attempts,
+            "status": doc.status,
+            "error": error,
+            "time": str(now_datetime()),
+        })
+
+        frappe.db.set_value(
+            "WhatsApp Message",
+            name,
+            {
+                "status": doc.status,
+                "message_id": doc.message_id,
+                "attempts": attempts,
+                "attempt_log": json.dumps(attempt_log),
+            },
+            update_modified=False,
+        )
+
+        failed = doc.status == "Failed"
+        if attempts > 1 and doc.bulk_message_reference:
+            sent, recovered = retries.get(doc.bulk_message_reference, (0, 0))
+            retries[doc.bulk_message_reference] = (sent + 1, recovered + (not failed))
+        elif doc.bulk_message_chunk:
+            sent, failed_count = chunks.get(doc.bulk_message_chunk, (0, 0))
+            chunks[doc.bulk_message_chunk] = (sent + (not failed), failed_count + failed)
+
+        frappe.db.commit()
+
+    report_chunks(chunks)
+    report_retries(retries)
+
+
 def on_doctype_update():
     frappe.db.add_index("WhatsApp Message", ["reference_doctype", "reference_name"])
+    frappe.db.add_index("WhatsApp Message", ["bulk_message_reference", "status"])
+    frappe.db.add_index("WhatsApp Message", ["from", "creation"])
+    frappe.db.add_index("WhatsApp Message", ["to", "creation"])
+    frappe.db.add_index("WhatsApp Message", ["conversation_id", "creation"])
+    frappe.db.add_index("WhatsApp Message", ["status", "modified"])
+    frappe.db.add_unique("WhatsApp Message", ["message_id"], constraint_name="unique_message_id")
 
 
 @frappe.whitelist()
@@ -265,3 +349,106 @@ def send_message(to, message, content_type="text", attach=None, reference_doctyp
     except Exception as e:
         frappe.log_error("WhatsApp Send Message Error", str(e))
         raise e
+
+
+
+@frappe.whitelist()
+def send_messages(messages):
+    """Queue a batch of outgoing messages and return one result per item.
+
+    Each item accepts `to`, `message`, `content_type`, `attach`,
+    `reference_doctype`, `reference_name`, `priority` and an optional
+    `idempotency_key`. Messages are persisted in one insert and released to
+    WAHA by the dispatcher through their priority lane.
+    """
+    frappe.has_permission("WhatsApp Message", "create", throw=True)
+
+    if isinstance(messages, str):
+        messages = json.loads(messages)
+
+    if not isinstance(messages, list):
+        frappe.throw(_("Messages must be a list"))
+
+    if len(messages) > MAX_BATCH_SIZE:
+        frappe.throw(_("At most {0} messages can be sent per call").format(MAX_BATCH_SIZE))
+
+    keys = [m.get("idempotency_key") for m in messages if isinstance(m, dict) and m.get("idempotency_key")]
+    existing = {}
+    if keys:
+        existing = dict(frappe.get_all(
+            "WhatsApp Message",
+            filters={"idempotency_key": ["in", keys]},
+            fields=["idempotency_key", "name"],
+            as_list=True,
+        ))
+
+    results = []
+    rows = []
+    pending = {}
+    for message in messages:
+        key = message.get("idempotency_key") if isinstance(message, dict) else None
+        if key in existing:
+            results.append({"name": existing[key], "idempotency_key": key, "status": "Duplicate"})
+            continue
+
+        if key in pending:
+            results.append({"idempotency_key": key, "status": "Duplicate", "duplicate_of": pending[key]})
+            continue
+
+        error = validate_batch_message(message)
+        if error:
+            results.append({"idempotency_key": key, "status": "Rejected", "error": error})
+            continue
+
+        if key:
+            pending[key] = len(results)
+
+        rows.append((len(results), {
+            "type": "Outgoing",
+            "status": "Queued",
+            "to": phone.normalize(message["to"]),
+            "message": message.get("message"),
+            "message_type": "Manual",
+            "priority": dispatcher.get_lane(message.get("priority")),
+            "content_type": message.get("content_type") or "text",
+            "attach": message.get("attach"),
+            "reference_doctype": message.get("reference_doctype"),
+            "reference_name": message.get("reference_name"),
+            "idempotency_key": key,
+        }))
+        results.append(None)
+
+    names = bulk_insert_messages([row for _, row in rows])
+    for (index, row), name in zip(rows, names):
+        results[index] = {"name": name, "idempotency_key": row["idempotency_key"], "status": "Queued"}
+
+    for result in results:
+        if "duplicate_of" in result:
+            result["name"] = results[result.pop("duplicate_of")]["name"]
+
+    lanes = {}
+    for (index, row), name in zip(rows, names):
+        lanes.setdefault(row["priority"], []).append(name)
+    for priority, lane_names in lanes.items():
+        dispatcher.push(lane_names, priority)
+
+    return results
+
+
+def validate_batch_message(message):
+    """Return an error for an invalid batch item, None if it is valid."""
+    if not isinstance(message, dict):
+        return _("Message must be an object")
+
+    if not message.get("to") or not phone.normalize(message["to"]):
+        return _("Invalid recipient number")
+
+    content_type = message.get("content_type") or "text"
+    if content_type not in BATCH_CONTENT_TYPES:
+        return _("Unsupported content type {0}").format(content_type)
+
+    if content_type == "text" and not message.get("message"):
+        return _("Message is required for text messages")
+
+    if content_type != "text" and not message.get("attach"):
+        return _("Attachment is required for {0} messages").format(content_type)
@@ -1,16 +1,20 @@
 """Notification."""
 
-import json
 import frappe
 import datetime
 
 from frappe import _dict, _
 from frappe.model.document import Document
 from frappe.utils.safe_exec import get_safe_globals, safe_exec
-from frappe.desk.form.utils import get_pdf_link
 from frappe.utils import add_to_date, nowdate
 import requests
 
+from frappe_whatsapp.utils.dispatcher import consume
+from frappe_whatsapp.utils.log_writer import log
+from frappe_whatsapp.utils.message_store import bulk_insert_messages
+from frappe_whatsapp.utils.phone import from_chat_id, to_chat_id
+from frappe_whatsapp.utils.print_cache import get_cached_pdf_url, get_print_pdf_url
+
 
 class WhatsAppNotification(Document):
     """Notification."""
@@ -113,17 +117,34 @@ class WhatsAppNotification(Document):
         }
 
         if self.attach_document_print or self.custom_attachment:
-            file_url = self.get_attachment_url(doc, doc_data)
-            
             if self.attach_document_print:
                 data["file"] = {
-                    "url": file_url,
                     "filename": f'{doc_data["name"]}.pdf'
                 }
                 if message_text:
                     data["caption"] = message_text
+
+                print_format = self.get_print_format(doc_data)
+                file_url = get_cached_pdf_url(doc, print_format)
+                if not file_url:
+                    # Rendering can take seconds, warm the cache and send in the background
+                    frappe.enqueue_doc(
+                        self.doctype, self.name,
+                        "send_print_attachment",
+                        enqueue_after_commit=True,
+                        reference_doctype=doc.doctype,
+                        reference_name=doc.name,
+                        print_format=print_format,
+                        data=data,
+                    )
+                    return
+
+                data["file"]["url"] = file_url
                 self.notify_waha(data, "/api/sendFile", doc_data)
-            elif self.custom_attachment:
+                return
+
+            file_url = self.get_attachment_url(doc, doc_data)
+            if self.custom_attachment:
                 mimetype = self.get_mimetype_from_url(file_url)
                 
                 if mimetype.startswith("image/"):
@@ -157,33 +178,36 @@ class WhatsAppNotification(Document):
             self.notify_waha(data, "/api/sendText", doc_data)
 
 
+    def send_print_attachment(self, reference_doctype, reference_name, print_format, data):
+        """Render the print PDF into the cache, then send it."""
+        doc = frappe.get_doc(reference_doctype, reference_name)
+        data["file"]["url"] = get_print_pdf_url(doc, print_format)
+        self.notify_waha(data, "/api/sendFile", doc.as_dict())
+
+    def get_print_format(self, doc_data):
+        """Get the default print format of the document's DocType."""
+        print_format = "Standard"
+        doctype = frappe.get_doc("DocType", doc_data['doctype'])
+        if doctype.custom:
+            if doctype.default_print_format:
+                print_format = doctype.default_print_format
+        else:
+            default_print_format = frappe.db.get_value(
+                "Property Setter",
+                filters={
+                    "doc_type": doc_data['doctype'],
+                    "property": "default_print_format"
+                },
+                fieldname="value"
+            )
+            print_format = default_print_format if default_print_format else print_format
+
+        return print_format
+
     def get_attachment_url(self, doc, doc_data):
         """Get attachment URL."""
         if self.attach_document_print:
-            key = doc.get_document_share_key()
-            frappe.db.commit()
-            print_format = "Standard"
-            doctype = frappe.get_doc("DocType", doc_data['doctype'])
-            if doctype.custom:
-                if doctype.default_print_format:
-                    print_format = doctype.default_print_format
-            else:
-                default_print_format = frappe.db.get_value(
-                    "Property Setter",
-                    filters={
-                        "doc_type": doc_data['doctype'],
-                        "property": "default_print_format"
-                    },
-                    fieldname="value"
-                )
-                print_format = default_print_format if default_print_format else print_format
-            
-            link = get_pdf_link(
-                doc_data['doctype'],
-                doc_data['name'],
-                print_format=print_format
-            )
-            return f'{frappe.utils.get_url()}{link}&key={key}'
+            return get_print_pdf_url(doc, self.get_print_format(doc_data))
         
         elif self.custom_attachment:
             if self.attach_from_field:
@@ -247,8 +271,10 @@ class WhatsAppNotification(Document):
                 "doctype": "WhatsApp Message",
                 "type": "Outgoing",
                 "message": data.get("text") or data.get("caption", ""),
-                "to": data["chatId"].replace("@c.us", ""),
+                "to": from_chat_id(data["chatId"]),
                 "message_type": "Manual",
+                "status": "Success",
+                "priority": "Notification",
                 "message_id": response_data.get("id"),
                 "content_type": self.get_content_type(endpoint),
             }
@@ -259,7 +285,9 @@ class WhatsAppNotification(Document):
                     "reference_name": doc_data.name,
                 })
 
-            frappe.get_doc(new_doc).save(ignore_permissions=True)
+            # Already sent above, so persist without triggering another send
+            bulk_insert_messages([new_doc])
+            consume(1)
 
             if doc_data and self.set_property_after_alert and self.property_value:
                 if doc_data.doctype and doc_data.name:
@@ -295,11 +323,7 @@ class WhatsAppNotification(Document):
             else:
                 meta = response_data
             
-            frappe.get_doc({
-                "doctype": "WhatsApp Notification Log",
-                "template": "Notification",
-                "meta_data": json.dumps(meta)
-            }).insert(ignore_permissions=True)
+            log("Notification", meta, error=not success)
 
 
     def get_content_type(self, endpoint):
@@ -327,15 +351,7 @@ class WhatsAppNotification(Document):
 
     def format_number(self, number):
         """Format number to WAHA chatId format."""
-        if number.startswith("+"):
-            number = number[1:]
-        
-        number = number.replace(" ", "").replace("-", "")
-        
-        if not number.endswith("@c.us") and not number.endswith("@g.us"):
-            number = f"{number}@c.us"
-        
-        return number
+        return to_chat_id(number)
 
 
     def get_documents_for_today(self):
@@ -0,0 +1,14 @@
+# Copyright (c) 2026, Shridhar Patil and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class WhatsAppPhoneIndex(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("WhatsApp Phone Index", ["number", "priority"])
+	frappe.db.add_index("WhatsApp Phone Index", ["reference_doctype", "reference_name"])
@@ -1,6 +1,6 @@
 frappe.ui.form.on('WhatsApp Recipient List', {
     refresh: function(frm) {
-        frm.fields_dict.import_button.onclick = function() {
+        let import_recipients = function(resync) {
             if(!frm.doc.doctype_to_import || !frm.doc.mobile_field) {
                 frappe.throw(__('Please select a DocType and Mobile Field before importing'));
                 return;
@@ -25,17 +25,81 @@ frappe.ui.form.on('WhatsApp Recipient List', {
                     name_field: frm.doc.name_field,
                     filters: filters,
                     limit: frm.doc.import_limit,
-                    data_fields: frm.doc.data_fields
+                    data_fields: frm.doc.data_fields,
+                    resync: resync ? 1 : 0
                 },
                 callback: function(r) {
                     if(r.message) {
-                        frappe.msgprint(__(`${r.message} recipients imported successfully`));
-                        frm.reload_doc();
+                        frappe.msgprint(__('Import started in the background. Reload the list once it completes.'));
                     }
                 }
             });
         };
-        
+
+        frappe.realtime.off('whatsapp_recipient_import');
+        frappe.realtime.on('whatsapp_recipient_import', function(data) {
+            if(data.list_name !== frm.doc.name) return;
+
+            let message = __('{0} recipients imported, {1} rows rejected', [data.imported, data.rejected]);
+            if(data.report) {
+                message += '<br><a href="' + data.report + '">' + __('Download rejected rows') + '</a>';
+            }
+            frappe.msgprint({title: __('Import Finished'), message: message, indicator: data.rejected ? 'orange' : 'green'});
+            frm.reload_doc();
+        });
+
+        frm.fields_dict.import_button.onclick = () => import_recipients(false);
+
+        if(frm.doc.doctype_to_import && frm.doc.mobile_field) {
+            frm.add_custom_button(__('Re-sync Recipients'), () => import_recipients(true));
+        }
+
+        if(!frm.is_new()) {
+            // Imported recipients are not loaded with the form, show their count instead
+            frappe.call({
+                method: 'frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list.get_recipient_count',
+                args: {list_name: frm.doc.name},
+                callback: function(r) {
+                    frm.set_intro(__('{0} recipients in this list', [r.message || 0]), 'blue');
+                }
+            });
+
+            frm.add_custom_button(__('View Recipients'), function() {
+                show_recipients(frm);
+            });
+
+            frm.add_custom_button(__('Import from File'), function() {
+                let d = new frappe.ui.Dialog({
+                    title: __('Import from File'),
+                    fields: [
+                        {label: __('CSV or XLSX File'), fieldname: 'file_url', fieldtype: 'Attach', reqd: 1},
+                        {label: __('Mobile Number Column'), fieldname: 'mobile_column', fieldtype: 'Data', reqd: 1},
+                        {label: __('Recipient Name Column'), fieldname: 'name_column', fieldtype: 'Data'},
+                        {fieldtype: 'HTML', options: '<p class="text-muted">' + __('The first row must be the header. Other columns are stored as recipient data.') + '</p>'}
+                    ],
+                    primary_action_label: __('Import'),
+                    primary_action: function(values) {
+                        frappe.call({
+                            method: 'frappe_whatsapp.utils.bulk_messaging.import_recipients_from_file',
+                            args: {
+                                list_name: frm.doc.name,
+                                file_url: values.file_url,
+                                mobile_column: values.mobile_column,
+                                name_column: values.name_column
+                            },
+                            callback: function(r) {
+                                if(r.message) {
+                                    d.hide();
+                                    frappe.msgprint(__('Import started in the background. Reload the list once it completes.'));
+                                }
+                            }
+                        });
+                    }
+                });
+                d.show();
+            });
+        }
+
         // Add a button to add a test recipient
         frm.add_custom_button(__('Add Test Recipient'), function() {
             let d = new frappe.ui.Dialog({
@@ -125,3 +189,48 @@ frappe.ui.form.on('WhatsApp Recipient List', {
         });
     }
 });
+
+function show_recipients(frm) {
+    let cursors = [null];
+    let d = new frappe.ui.Dialog({
+        title: __('Recipients'),
+        size: 'large',
+        fields: [{fieldname: 'recipients_html', fieldtype: 'HTML'}],
+        primary_action_label: __('Next'),
+        primary_action: function() {
+            if(cursors[cursors.length - 1]) {
+                load_page(cursors.length - 1);
+            }
+        },
+        secondary_action_label: __('Previous'),
+        secondary_action: function() {
+            if(cursors.length > 2) {
+                cursors.pop();
+                load_page(cursors.length - 2);
+            }
+        }
+    });
+
+    let load_page = function(page) {
+        frappe.call({
+            method: 'frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list.get_recipients',
+            args: {list_name: frm.doc.name, after: cursors[page]},
+            callback: function(r) {
+                cursors = cursors.slice(0, page + 1);
+                cursors.push(r.message.next_cursor);
+
+                let html = '<table class="table table-bordered">';
+                html += '<thead><tr><th>' + __('Mobile Number') + '</th><th>' + __('Recipient Name') + '</th></tr></thead><tbody>';
+                r.message.recipients.forEach(function(row) {
+                    html += '<tr><td>' + frappe.utils.escape_html(row.mobile_number || '') + '</td><td>'
+                        + frappe.utils.escape_html(row.recipient_name || '') + '</td></tr>';
+                });
+                html += '</tbody></table>';
+                d.fields_dict.recipients_html.$wrapper.html(html);
+            }
+        });
+    };
+
+    load_page(0);
+    d.show();
+}
@@ -1,7 +1,14 @@
 import frappe
-import json
 from frappe import _
 from frappe.model.document import Document
+from frappe.utils import cint
+
+from frappe_whatsapp.utils.recipient_import import import_from_doctype
+from frappe_whatsapp.utils.segments import clear_segment_map, enqueue_segment_sync
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SEGMENT_FIELDS = ("is_dynamic", "import_from_doctype", "doctype_to_import", "mobile_field", "name_field", "import_filters", "data_fields")
 
 
 class WhatsAppRecipientList(Document):
@@ -10,70 +17,68 @@ class WhatsAppRecipientList(Document):
 	
 	def validate_recipients(self):
 		if not self.is_new():
-			if not self.recipients:
+			if not self.recipients and not frappe.db.exists(
+				"WhatsApp Recipient", {"parent": self.name, "parenttype": self.doctype}
+			):
 				frappe.throw(_("At least one recipient is required"))
 	
-	def import_list_from_doctype(self, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None):
+	def on_update(self):
+		clear_segment_map()
+		if self.is_dynamic and self.import_from_doctype and self.doctype_to_import and self.mobile_field:
+			# Rebuild the segment once, document events keep it current afterwards
+			if any(self.has_value_changed(field) for field in SEGMENT_FIELDS):
+				enqueue_segment_sync(self.name)
+
+	def on_trash(self):
+		clear_segment_map()
+		# Stored recipients are not children of the document, remove them explicitly
+		frappe.db.delete("WhatsApp Recipient", {"parent": self.name, "parenttype": self.doctype})
+
+	def import_list_from_doctype(self, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None, resync=False):
 		"""Import recipients from another DocType"""
-		self.doctype_to_import = doctype
-		self.mobile_field = mobile_field
-		self.filters = filters
-		if data_fields:
-			self.data_fields = json.dumps(data_fields)
-
-		if limit:
-			self.import_limit = limit
-
-		fields = [mobile_field]
-		if name_field:
-			fields.append(name_field)
-		if data_fields:
-			meta = frappe.get_meta(doctype)
-			# print(meta.fields)
-			for field in meta.fields:
-				if field.fieldname not in fields and field.fieldname in data_fields:
-					fields.append(field.fieldname)
-		# Get records from the doctype
-		records = frappe.get_all(
-			doctype,
-			filters=filters,
-			fields=fields,
-			limit=limit
-		)
-		
-		# Clear existing recipients
-		self.recipients = []
-		
-		# Add recipients
-		for record in records:
-			if not record.get(mobile_field):
-				continue
-				
-			# Format mobile number
-			mobile = record.get(mobile_field)
-			# Remove any non-numeric characters except '+'
-			mobile = ''.join(char for char in mobile if char.isdigit() or char == '+')
-			
-			if not mobile:
-				continue
-
-			recipient_data = {}
-			if data_fields:
-				for field in data_fields:
-					if record.get(field):
-						# Use field name as the variable name in recipient data
-						variable_name = field.lower().replace(" ", "_")
-						recipient_data[variable_name] = record.get(field)
-
-				
-			recipient = {
-				"mobile_number": mobile,
-				"recipient_data": json.dumps(recipient_data)
-			}
-			
-			if name_field and record.get(name_field):
-				recipient["recipient_name"] = record.get(name_field)
-				
-			self.append("recipients", recipient)
-		
-		return len(self.recipients)
\ No newline at end of file
+		return import_from_doctype(self.name, doctype, mobile_field, name_field, filters, limit, data_fields, resync)
+
+
+def iter_recipients(list_name, fields=None, batch_size=1000):
+	"""Lazily yield every recipient of a list, one keyset page at a time"""
+	after = None
+	while True:
+		page = get_recipient_page(list_name, after, batch_size, fields)
+		if not page:
+			return
+		yield from page
+		after = page[-1].name
+
+
+def get_recipient_page(list_name, after=None, limit=PAGE_SIZE, fields=None):
+	filters = {"parent": list_name, "parenttype": "WhatsApp Recipient List"}
+	if after:
+		filters["name"] = [">", after]
+
+	return frappe.get_all(
+		"WhatsApp Recipient",
+		filters=filters,
+		fields=fields or ["name", "mobile_number", "recipient_name", "recipient_data"],
+		order_by="name asc",
+		limit_page_length=limit
+	)
+
+
+@frappe.whitelist()
+def get_recipients(list_name, after=None, limit=PAGE_SIZE):
+	"""Get a page of recipients and the cursor for the next page"""
+	frappe.get_doc("WhatsApp Recipient List", list_name).check_permission("read")
+
+	limit = min(cint(limit) or PAGE_SIZE, MAX_PAGE_SIZE)
+	recipients = get_recipient_page(list_name, after, limit)
+	return {
+		"recipients": recipients,
+		"next_cursor": recipients[-1].name if len(recipients) == limit else None,
+	}
+
+
+@frappe.whitelist()
+def get_recipient_count(list_name):
+	"""Count all recipients of a list, including ones not loaded with the form"""
+	frappe.get_doc("WhatsApp Recipient List", list_name).check_permission("read")
+	return frappe.db.count("WhatsApp Recipient", {"parent": list_name, "parenttype": "WhatsApp Recipient List"})
@@ -1,8 +1,48 @@
 # Copyright (c) 2022, Shridhar Patil and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
+from frappe import _
 from frappe.model.document import Document
 
+from frappe_whatsapp.utils.phone_index import clear_source_map, get_source_error
+
 class WhatsAppSettings(Document):
-	pass
+	def validate(self):
+		self.validate_phone_index_sources()
+
+	def validate_phone_index_sources(self):
+		"""Check every phone index source against its DocType"""
+		for row in self.phone_index_sources:
+			error = get_source_error(row.reference_doctype, row.phone_field)
+			if error:
+				frappe.throw(_("Row {0}: {1}").format(row.idx, error))
+
+	def on_update(self):
+		self.rebuild_phone_index_if_changed()
+
+		# Building locks the messages table for writes, so it is left to the nightly job
+		if not self.enable_fulltext_search and self.has_value_changed("enable_fulltext_search"):
+			frappe.enqueue(
+				"frappe_whatsapp.utils.message_search.drop_fulltext_index",
+				queue="long",
+				enqueue_after_commit=True,
+			)
+
+	def rebuild_phone_index_if_changed(self):
+		"""Re-index linked records when the phone sources change"""
+		sources = [(row.reference_doctype, row.phone_field) for row in self.phone_index_sources]
+		before = self.get_doc_before_save()
+		previous = [(row.reference_doctype, row.phone_field) for row in before.phone_index_sources] if before else []
+		if sources == previous:
+			return
+
+		clear_source_map()
+		frappe.enqueue(
+			"frappe_whatsapp.utils.phone_index.rebuild_phone_index",
+			queue="long",
+			timeout=6 * 3600,
+			job_id=f"whatsapp_phone_index_rebuild|{frappe.local.site}",
+			deduplicate=True,
+			enqueue_after_commit=True,
+		)
@@ -115,11 +115,25 @@ app_include_js = "/assets/frappe_whatsapp/js/frappe_whatsapp.js"
 # ---------------
 
 scheduler_events = {
+    "cron": {
+        "* * * * *": [
+            "frappe_whatsapp.utils.dispatcher.dispatch",
+            "frappe_whatsapp.utils.campaign_scheduler.release_due_campaigns",
+            "frappe_whatsapp.utils.log_writer.flush_logs",
+            "frappe_whatsapp.utils.contacts.flush_contacts",
+            "frappe_whatsapp.utils.read_receipts.flush_read_receipts",
+        ],
+        "*/10 * * * *": [
+            "frappe_whatsapp.utils.dispatcher.requeue_stale",
+        ],
+    },
     "all": [
         "frappe_whatsapp.utils.trigger_whatsapp_notifications_all"
     ],
     "hourly": [
-        "frappe_whatsapp.utils.trigger_whatsapp_notifications_hourly"
+        "frappe_whatsapp.utils.trigger_whatsapp_notifications_hourly",
+        "frappe_whatsapp.utils.print_cache.evict_print_cache",
+        "frappe_whatsapp.utils.bulk_messaging.schedule_bulk_messages",
     ],
     "hourly_long": [
         "frappe_whatsapp.utils.trigger_whatsapp_notifications_hourly_long"
@@ -127,9 +141,13 @@ scheduler_events = {
     "daily": [
         "frappe_whatsapp.utils.trigger_whatsapp_notifications_daily",
         "frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_notification.whatsapp_notification.trigger_notifications",
+        "frappe_whatsapp.utils.segments.resync_segments",
     ],
     "daily_long": [
         "frappe_whatsapp.utils.trigger_whatsapp_notifications_daily_long",
+        "frappe_whatsapp.utils.log_retention.purge_logs",
+        "frappe_whatsapp.utils.message_archive.archive_messages",
+        "frappe_whatsapp.utils.message_search.sync_fulltext_index",
     ],
     "weekly": [
         "frappe_whatsapp.utils.trigger_whatsapp_notifications_weekly",
@@ -207,14 +225,34 @@ doc_events = {
         "after_insert": "frappe_whatsapp.utils.run_server_script_for_doc_event",
         "before_validate": "frappe_whatsapp.utils.run_server_script_for_doc_event",
         "validate": "frappe_whatsapp.utils.run_server_script_for_doc_event",
-        "on_update": "frappe_whatsapp.utils.run_server_script_for_doc_event",
+        "on_update": [
+            "frappe_whatsapp.utils.run_server_script_for_doc_event",
+            "frappe_whatsapp.utils.segments.update_segment_membership",
+            "frappe_whatsapp.utils.phone_index.update_phone_index",
+        ],
         "before_submit": "frappe_whatsapp.utils.run_server_script_for_doc_event",
-        "on_submit": "frappe_whatsapp.utils.run_server_script_for_doc_event",
+        "on_submit": [
+            "frappe_whatsapp.utils.run_server_script_for_doc_event",
+            "frappe_whatsapp.utils.segments.update_segment_membership",
+            "frappe_whatsapp.utils.phone_index.update_phone_index",
+        ],
         "before_cancel": "frappe_whatsapp.utils.run_server_script_for_doc_event",
-        "on_cancel": "frappe_whatsapp.utils.run_server_script_for_doc_event",
-        "on_trash": "frappe_whatsapp.utils.run_server_script_for_doc_event",
+        "on_cancel": [
+            "frappe_whatsapp.utils.run_server_script_for_doc_event",
+            "frappe_whatsapp.utils.segments.update_segment_membership",
+            "frappe_whatsapp.utils.phone_index.update_phone_index",
+        ],
+        "on_trash": [
+            "frappe_whatsapp.utils.run_server_script_for_doc_event",
+            "frappe_whatsapp.utils.segments.update_segment_membership",
+            "frappe_whatsapp.utils.phone_index.update_phone_index",
+        ],
         "after_delete": "frappe_whatsapp.utils.run_server_script_for_doc_event",
         "before_update_after_submit": "frappe_whatsapp.utils.run_server_script_for_doc_event",
-        "on_update_after_submit": "frappe_whatsapp.utils.run_server_script_for_doc_event"
+        "on_update_after_submit": [
+            "frappe_whatsapp.utils.run_server_script_for_doc_event",
+            "frappe_whatsapp.utils.segments.update_segment_membership",
+            "frappe_whatsapp.utils.phone_index.update_phone_index",
+        ]
     }
 }
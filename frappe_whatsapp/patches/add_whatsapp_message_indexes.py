@@ -0,0 +1,59 @@
+import frappe
+
+TABLE = "tabWhatsApp Message"
+
+# Same names frappe.db.add_index / add_unique use, so on_doctype_update finds them
+INDEXES = {
+    "bulk_message_reference_status_index": ["bulk_message_reference", "status"],
+    "from_creation_index": ["from", "creation"],
+    "to_creation_index": ["to", "creation"],
+}
+
+
+def execute():
+    if not frappe.db.table_exists("WhatsApp Message"):
+        return
+
+    # add_unique in on_doctype_update fails on duplicates, on every backend
+    if not frappe.db.has_index(TABLE, "unique_message_id"):
+        deduplicate_message_ids()
+
+    if frappe.db.db_type != "mariadb":
+        # Other databases build them through on_doctype_update
+        return
+
+    for index_name, columns in INDEXES.items():
+        if not frappe.db.has_index(TABLE, index_name):
+            add_index_online(f"index `{index_name}` ({', '.join(f'`{column}`' for column in columns)})")
+
+    if not frappe.db.has_index(TABLE, "unique_message_id"):
+        add_index_online("unique `unique_message_id` (`message_id`)")
+
+
+def add_index_online(definition):
+    """Build an index without blocking writes to the table."""
+    frappe.db.sql_ddl(f"alter table `{TABLE}` add {definition}, algorithm=inplace, lock=none")
+
+
+def deduplicate_message_ids():
+    """Keep message_id on one row of each duplicate group, suffix the rest with their name.
+
+    Plain selects and updates so it runs on MariaDB and PostgreSQL alike.
+    """
+    frappe.db.sql(f"update `{TABLE}` set message_id = null where message_id = ''")
+    duplicates = frappe.db.sql_list(f"""
+        select message_id from `{TABLE}`
+        where message_id is not null
+        group by message_id having count(*) > 1
+    """)
+    for message_id in duplicates:
+        names = frappe.db.sql_list(
+            f"select name from `{TABLE}` where message_id = %s order by name",
+            message_id,
+        )
+        for name in names[1:]:
+            frappe.db.sql(
+                f"update `{TABLE}` set message_id = %s where name = %s",
+                (f"{message_id}|{name}", name),
+            )
+    frappe.db.commit()
@@ -0,0 +1,12 @@
+import frappe
+
+from frappe_whatsapp.patches.add_whatsapp_message_indexes import TABLE, add_index_online
+
+
+def execute():
+    if frappe.db.db_type != "mariadb":
+        return
+
+    # Used by the stale Queued sweep of the dispatcher
+    if not frappe.db.has_index(TABLE, "status_modified_index"):
+        add_index_online("index `status_modified_index` (`status`, `modified`)")
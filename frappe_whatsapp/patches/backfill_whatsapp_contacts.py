@@ -0,0 +1,55 @@
+import frappe
+
+from frappe_whatsapp.utils import contacts, message_archive
+from frappe_whatsapp.utils.conversations import get_contact_number
+
+BATCH_SIZE = 5000
+
+
+def execute():
+    # Totals are rebuilt from the full history, drop what live traffic recorded so far
+    contacts.flush_contacts()
+    frappe.db.sql(
+        """update `tabWhatsApp Contact`
+        set incoming_count = 0, outgoing_count = 0, first_seen = null, last_seen = null"""
+    )
+
+    for table in [message_archive.MESSAGE_TABLE, *message_archive.get_archive_tables()]:
+        backfill(table)
+
+
+def backfill(table):
+    last_name = ""
+    while True:
+        messages = frappe.db.sql(
+            f"""select name, creation, type, `from`, `to`, profile_name
+            from `{table}`
+            where name > %s
+            order by name limit %s""",
+            (last_name, BATCH_SIZE),
+            as_dict=True,
+        )
+        if not messages:
+            break
+        last_name = messages[-1].name
+
+        entries = []
+        for message in messages:
+            number = get_contact_number(message)
+            if not number or number.endswith("@g.us"):
+                continue
+
+            incoming = message.type == "Incoming"
+            entries.append({
+                "number": number,
+                "incoming": int(incoming),
+                "outgoing": int(not incoming),
+                "at": str(message.creation),
+                "profile_name": message.profile_name if incoming else None,
+            })
+
+        if entries:
+            aggregated = contacts.aggregate(entries)
+            contacts.upsert(aggregated)
+            contacts.link_contacts(list(aggregated))
+        frappe.db.commit()
@@ -0,0 +1,38 @@
+import frappe
+
+from frappe_whatsapp.utils import conversations
+
+BATCH_SIZE = 5000
+
+
+def execute():
+    session = conversations.get_session()
+    last_name = ""
+    while True:
+        messages = frappe.db.sql(
+            """select name, creation, type, `from`, `to`, message, content_type, profile_name
+            from `tabWhatsApp Message`
+            where name > %s and ifnull(conversation_id, '') = ''
+            order by name limit %s""",
+            (last_name, BATCH_SIZE),
+            as_dict=True,
+        )
+        if not messages:
+            break
+        last_name = messages[-1].name
+
+        by_conversation = {}
+        for message in messages:
+            message.conversation_id = conversations.get_conversation_id(message, session)
+            if message.conversation_id:
+                by_conversation.setdefault(message.conversation_id, []).append(message.name)
+
+        for conversation_id, names in by_conversation.items():
+            frappe.db.sql(
+                "update `tabWhatsApp Message` set conversation_id = %s where name in %s",
+                (conversation_id, names),
+            )
+
+        # History is already read, only new incoming messages count as unread
+        conversations.touch(messages, count_unread=False)
+        frappe.db.commit()
@@ -0,0 +1,23 @@
+import frappe
+
+from frappe_whatsapp.utils.recipient_import import STORED_PARENTFIELD
+
+# Lists above this size are slow to load as child rows
+MAX_CHILD_ROWS = 1000
+
+
+def execute():
+    lists = frappe.db.sql(
+        """select parent from `tabWhatsApp Recipient`
+        where parenttype = 'WhatsApp Recipient List' and parentfield = 'recipients'
+        group by parent having count(*) > %s""",
+        MAX_CHILD_ROWS,
+    )
+
+    for (list_name,) in lists:
+        frappe.db.sql(
+            """update `tabWhatsApp Recipient` set parentfield = %s
+            where parent = %s and parenttype = 'WhatsApp Recipient List'""",
+            (STORED_PARENTFIELD, list_name),
+        )
+        frappe.db.commit()
@@ -42,7 +42,33 @@ $(document).on("app_ready", function () {
                                         }
                                     },
                                 },
-                                { label: "Mobile no", fieldname: "mobile_no", fieldtype: "Data", reqd: 1 },
+                                {
+                                    label: "Mobile no",
+                                    fieldname: "mobile_no",
+                                    fieldtype: "Data",
+                                    reqd: 1,
+                                    change() {
+                                        let mobile_no = dialog.get_value("mobile_no")
+                                        dialog.fields_dict.ht.$wrapper.html("")
+                                        if (!mobile_no || !frappe.model.can_read("WhatsApp Contact")) return
+                                        frappe.call({
+                                            method: "frappe_whatsapp.utils.contacts.get_contact",
+                                            args: { number: mobile_no },
+                                            callback: function (r) {
+                                                if (r.message) {
+                                                    dialog.fields_dict.ht.$wrapper.html(
+                                                        '<p class="text-muted">' +
+                                                            __("On WhatsApp as {0}, last seen {1}", [
+                                                                frappe.utils.escape_html(r.message.profile_name || r.message.name),
+                                                                frappe.datetime.comment_when(r.message.last_seen),
+                                                            ]) +
+                                                            "</p>"
+                                                    )
+                                                }
+                                            },
+                                        })
+                                    },
+                                },
                                 { label: "Message", fieldname: "message", fieldtype: "Small Text", reqd: 1 },
                                 { label: "Content Type", fieldname: "content_type", fieldtype: "Select", options: "text\nimage\nvideo\ndocument\naudio", default: "text" },
                                 { label: "Attachment", fieldname: "attach", fieldtype: "Attach" },
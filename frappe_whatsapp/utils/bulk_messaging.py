@@ -1,6 +1,7 @@
 import json
 import frappe
-from frappe.utils import cint
+from frappe import _
+from frappe.utils import add_to_date, cint, now_datetime
 
 
 @frappe.whitelist()
@@ -13,12 +14,38 @@ def get_progress(name):
 def retry_failed(name):
     """Retry failed messages"""
     doc = frappe.get_doc("Bulk WhatsApp Message", name)
-    doc.retry_failed()
+    doc.check_permission("write")
+    frappe.enqueue_doc(doc.doctype, doc.name, "retry_failed", "long", 4000)
+    frappe.msgprint(_("Failed messages are being requeued for sending"))
     return True
 
 @frappe.whitelist()
-def import_recipients(list_name, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None):
-    """Import recipients from a DocType"""
+def pause(name):
+    """Pause a running bulk message"""
+    doc = frappe.get_doc("Bulk WhatsApp Message", name)
+    doc.check_permission("write")
+    doc.pause()
+    return True
+
+@frappe.whitelist()
+def resume(name):
+    """Resume a paused bulk message from its cursor"""
+    doc = frappe.get_doc("Bulk WhatsApp Message", name)
+    doc.check_permission("write")
+    doc.resume()
+    return True
+
+@frappe.whitelist()
+def cancel(name):
+    """Cancel sending of a bulk message"""
+    doc = frappe.get_doc("Bulk WhatsApp Message", name)
+    doc.check_permission("write")
+    doc.cancel_sending()
+    return True
+
+@frappe.whitelist()
+def import_recipients(list_name, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None, resync=0):
+    """Import recipients from a DocType in the background"""
     if filters and isinstance(filters, str):
         filters = json.loads(filters)
 
@@ -26,39 +53,55 @@ def import_recipients(list_name, doctype, mobile_field, name_field=None, filters
         data_fields = json.loads(data_fields)
         
     doc = frappe.get_doc("WhatsApp Recipient List", list_name)
-    count = doc.import_list_from_doctype(doctype, mobile_field, name_field, filters, limit, data_fields)
-    doc.save()
+    doc.check_permission("write")
+    frappe.enqueue(
+        "frappe_whatsapp.utils.recipient_import.import_from_doctype",
+        queue="long",
+        timeout=6 * 3600,
+        list_name=list_name,
+        doctype=doctype,
+        mobile_field=mobile_field,
+        name_field=name_field,
+        filters=filters,
+        limit=limit,
+        data_fields=data_fields,
+        resync=cint(resync),
+    )
     
-    return count
+    return True
+
+@frappe.whitelist()
+def import_recipients_from_file(list_name, file_url, mobile_column, name_column=None):
+    """Import recipients from an uploaded CSV or XLSX file in the background"""
+    doc = frappe.get_doc("WhatsApp Recipient List", list_name)
+    doc.check_permission("write")
+    # Checked again by the job, failing here reports it to the user right away
+    frappe.has_permission("File", "read", frappe.get_doc("File", {"file_url": file_url}), throw=True)
+    frappe.enqueue(
+        "frappe_whatsapp.utils.recipient_import.import_from_file",
+        queue="long",
+        timeout=6 * 3600,
+        list_name=list_name,
+        file_url=file_url,
+        mobile_column=mobile_column,
+        name_column=name_column,
+    )
+
+    return True
 
 @frappe.whitelist()
 def schedule_bulk_messages():
-    """Background job to process bulk WhatsApp messages"""
-    # Find queued bulk messages with recipient counts less than sent counts
-    bulk_messages = frappe.get_all(
-        "Bulk WhatsApp Message", 
+    """Background job to reconcile bulk messages whose progress reports were lost"""
+    # Healthy campaigns are closed by their chunk reports and keep `modified` fresh
+    stuck = frappe.get_all(
+        "Bulk WhatsApp Message",
         filters={
-            "status": "Queued",
+            "status": ["in", ["Queued", "In Progress"]],
+            "modified": ["<", add_to_date(now_datetime(), hours=-1)],
             "docstatus": 1
         },
-        fields=["name", "recipient_count", "sent_count"]
+        pluck="name"
     )
-    
-    for bulk in bulk_messages:
-        # Skip if all messages have been sent
-        if cint(bulk.sent_count) >= cint(bulk.recipient_count):
-            frappe.db.set_value("Bulk WhatsApp Message", bulk.name, "status", "Completed")
-            continue
-            
-        # Check for failed messages
-        failed_count = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": bulk.name,
-            "status": "Failed"
-        })
-        
-        # If all messages are either sent or failed
-        if cint(bulk.sent_count) - failed_count + cint(failed_count) >= cint(bulk.recipient_count):
-            if failed_count > 0:
-                frappe.db.set_value("Bulk WhatsApp Message", bulk.name, "status", "Partially Failed")
-            else:
-                frappe.db.set_value("Bulk WhatsApp Message", bulk.name, "status", "Completed")
+
+    for name in stuck:
+        frappe.get_doc("Bulk WhatsApp Message", name).reconcile()
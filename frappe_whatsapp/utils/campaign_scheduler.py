@@ -0,0 +1,47 @@
+"""Redis sorted-set timer wheel releasing Bulk WhatsApp Message batches.
+
+Timers are fired by the per-minute scheduler cron, not at their exact
+timestamp: `frappe.enqueue` has no delayed jobs and workers do not run the
+RQ scheduler. Campaigns are paced per minute anyway, so a timer fires up to
+a minute late.
+"""
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+TIMER_KEY = "whatsapp_campaign_timers"
+
+
+def timer_key():
+    return frappe.cache().make_key(TIMER_KEY)
+
+
+def schedule(name, when):
+    """Wake campaign `name` up at `when`."""
+    frappe.cache().zadd(timer_key(), {name: get_datetime(when).timestamp()})
+
+
+def unschedule(name):
+    """Drop any pending wake-up for campaign `name`."""
+    frappe.cache().zrem(timer_key(), name)
+
+
+def is_scheduled(name):
+    """Check whether campaign `name` has a pending wake-up."""
+    return frappe.cache().zscore(timer_key(), name) is not None
+
+
+def release_due_campaigns():
+    """Release the next batch of every campaign whose timer is due, run every minute."""
+    cache = frappe.cache()
+    due = cache.zrangebyscore(timer_key(), "-inf", now_datetime().timestamp())
+
+    for name in due:
+        # Only the worker that removes the entry releases it
+        if not cache.zrem(timer_key(), name):
+            continue
+
+        frappe.enqueue_doc(
+            "Bulk WhatsApp Message", frappe.safe_decode(name),
+            "release_batch",
+            "long", 4000
+        )
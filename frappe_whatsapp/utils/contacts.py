@@ -0,0 +1,181 @@
+"""WhatsApp Contact profiles aggregated from message traffic."""
+import json
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+from frappe_whatsapp.utils.conversations import get_contact_number
+from frappe_whatsapp.utils.phone import normalize
+
+BUFFER_KEY = "whatsapp_contact_buffer"
+FLUSH_BATCH_SIZE = 1000
+LINKED_DOCTYPES = ("Customer", "Lead", "Supplier")
+
+
+def buffer_key():
+    return frappe.cache().make_key(BUFFER_KEY)
+
+
+def record(messages):
+    """Buffer per-number activity of `messages` once the transaction commits.
+
+    Works on documents and plain dicts; numbers are aggregated first so a
+    chunk of messages becomes one buffer entry per number.
+    """
+    now = str(now_datetime())
+    activity = {}
+    for message in messages:
+        number = get_contact_number(message)
+        if not number or number.endswith("@g.us"):
+            continue
+
+        incoming = message.get("type") == "Incoming"
+        entry = activity.setdefault(number, {"number": number, "incoming": 0, "outgoing": 0, "at": now})
+        entry["incoming" if incoming else "outgoing"] += 1
+        if incoming and message.get("profile_name"):
+            entry["profile_name"] = message.get("profile_name")
+
+    if not activity:
+        return
+
+    def _buffer():
+        pipe = frappe.cache().pipeline()
+        pipe.rpush(buffer_key(), *(json.dumps(entry) for entry in activity.values()))
+        (length,) = pipe.execute()
+        if length >= FLUSH_BATCH_SIZE:
+            frappe.enqueue(
+                "frappe_whatsapp.utils.contacts.flush_contacts",
+                queue="short",
+                job_id=f"whatsapp_contact_flush|{frappe.local.site}",
+                deduplicate=True,
+            )
+
+    frappe.db.after_commit.add(_buffer)
+
+
+def flush_contacts():
+    """Upsert buffered activity into WhatsApp Contact, one statement per batch."""
+    cache = frappe.cache()
+    lock = cache.make_key("whatsapp_contact_flush_lock")
+    if not cache.set(lock, 1, nx=True, ex=300):
+        return
+
+    try:
+        key = buffer_key()
+        while True:
+            pipe = cache.pipeline()
+            pipe.lrange(key, 0, FLUSH_BATCH_SIZE - 1)
+            pipe.ltrim(key, FLUSH_BATCH_SIZE, -1)
+            raw, _ = pipe.execute()
+            if not raw:
+                break
+
+            contacts = aggregate(json.loads(item) for item in raw)
+            upsert(contacts)
+            link_contacts(list(contacts))
+            frappe.db.commit()
+    finally:
+        cache.delete(lock)
+
+
+def aggregate(entries):
+    contacts = {}
+    for entry in entries:
+        at = get_datetime(entry["at"])
+        contact = contacts.setdefault(entry["number"], {
+            "first_seen": at, "last_seen": at, "incoming": 0, "outgoing": 0, "profile_name": None,
+        })
+        contact["first_seen"] = min(contact["first_seen"], at)
+        contact["last_seen"] = max(contact["last_seen"], at)
+        contact["incoming"] += entry["incoming"]
+        contact["outgoing"] += entry["outgoing"]
+        contact["profile_name"] = entry.get("profile_name") or contact["profile_name"]
+    return contacts
+
+
+def upsert(contacts):
+    now = now_datetime()
+    rows = [
+        (number, now, now, "Administrator", "Administrator", 0, number, contact["profile_name"],
+        contact["first_seen"], contact["last_seen"], contact["incoming"], contact["outgoing"])
+        for number, contact in contacts.items()
+    ]
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+    frappe.db.sql(
+        f"""insert into `tabWhatsApp Contact`
+        (name, creation, modified, owner, modified_by, docstatus, number, profile_name,
+        first_seen, last_seen, incoming_count, outgoing_count)
+        values {placeholders}
+        on duplicate key update
+            profile_name = coalesce(nullif(values(profile_name), ''), profile_name),
+            first_seen = least(coalesce(first_seen, values(first_seen)), values(first_seen)),
+            last_seen = greatest(coalesce(last_seen, values(last_seen)), values(last_seen)),
+            incoming_count = incoming_count + values(incoming_count),
+            outgoing_count = outgoing_count + values(outgoing_count),
+            modified = values(modified)""",
+        [value for row in rows for value in row],
+    )
+
+
+def link_contacts(numbers):
+    """Link not yet linked WhatsApp Contacts to the Frappe Contact with their number."""
+    unlinked = frappe.get_all(
+        "WhatsApp Contact",
+        filters={"name": ["in", numbers], "contact": ["is", "not set"]},
+        pluck="name"
+    )
+    if not unlinked:
+        return
+
+    # Contact Phone rows are stored as typed, try the usual spellings
+    variants = {}
+    for number in unlinked:
+        for variant in (number, number[1:], f"00{number[1:]}"):
+            variants[variant] = number
+
+    contact_by_number = {}
+    for row in frappe.get_all(
+        "Contact Phone",
+        filters={"parenttype": "Contact", "phone": ["in", list(variants)]},
+        fields=["parent", "phone"],
+    ):
+        contact_by_number.setdefault(variants[row.phone], row.parent)
+
+    links = {}
+    if contact_by_number:
+        for row in frappe.get_all(
+            "Dynamic Link",
+            filters={
+                "parenttype": "Contact",
+                "parent": ["in", list(contact_by_number.values())],
+                "link_doctype": ["in", LINKED_DOCTYPES],
+            },
+            fields=["parent", "link_doctype", "link_name"],
+        ):
+            links.setdefault(row.parent, (row.link_doctype, row.link_name))
+
+    for number, contact in contact_by_number.items():
+        reference_doctype, reference_name = links.get(contact, (None, None))
+        frappe.db.set_value("WhatsApp Contact", number, {
+            "contact": contact,
+            "reference_doctype": reference_doctype,
+            "reference_name": reference_name,
+        }, update_modified=False)
+
+
+@frappe.whitelist()
+def get_contact(number):
+    """Get the WhatsApp profile of a number with a primary key read, None without read access."""
+    if not frappe.has_permission("WhatsApp Contact", "read"):
+        return None
+
+    number = normalize(number)
+    if not number:
+        return None
+
+    return frappe.db.get_value(
+        "WhatsApp Contact", number,
+        ["name", "profile_name", "first_seen", "last_seen", "incoming_count", "outgoing_count",
+        "contact", "reference_doctype", "reference_name"],
+        as_dict=True
+    )
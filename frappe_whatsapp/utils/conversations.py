@@ -0,0 +1,160 @@
+"""Conversation threads of WhatsApp Messages keyed by contact number and session."""
+import frappe
+from frappe.utils import cint, get_datetime, now_datetime
+
+from frappe_whatsapp.utils import inbox, message_archive
+from frappe_whatsapp.utils.phone import from_chat_id, normalize
+
+PREVIEW_LENGTH = 140
+UPSERT_BATCH_SIZE = 500
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+HISTORY_FIELDS = (
+    "name", "creation", "type", "from", "to", "message", "content_type", "attach",
+    "status", "message_id", "is_reply", "reply_to_message_id", "profile_name",
+)
+
+
+def get_session():
+    return frappe.db.get_single_value("WhatsApp Settings", "session_name") or "default"
+
+
+def get_contact_number(message):
+    """The other party of a message: the sender if incoming, the recipient otherwise."""
+    number = message.get("from") if message.get("type") == "Incoming" else message.get("to")
+    if not number:
+        return None
+
+    if number.endswith("@g.us"):
+        return number
+
+    # Incoming senders and chatIds are international numbers without the '+'
+    if message.get("type") == "Incoming" or number.endswith("@c.us"):
+        return from_chat_id(number) or number
+
+    return normalize(number) or number
+
+
+def get_conversation_id(message, session=None):
+    """Conversation of a message, None if it has no counterpart number."""
+    contact = get_contact_number(message)
+    if not contact:
+        return None
+
+    return f"{session or get_session()}:{contact}"
+
+
+def get_preview(message):
+    if message.get("content_type") in (None, "", "text"):
+        return (message.get("message") or "")[:PREVIEW_LENGTH]
+    return f"[{message.get('content_type')}]"
+
+
+def touch(messages, count_unread=True):
+    """Record messages as the latest activity of their conversations.
+
+    Works on documents and plain dicts. All conversations are written with one
+    upsert per batch, so callers can pass a whole chunk of messages.
+    """
+    now = now_datetime()
+    conversations = {}
+    for message in messages:
+        conversation_id = message.get("conversation_id")
+        if not conversation_id:
+            continue
+
+        at = get_datetime(message.get("creation")) if message.get("creation") else now
+        conversation = conversations.setdefault(conversation_id, {"at": None, "unread": 0})
+        if conversation["at"] is None or at >= conversation["at"]:
+            conversation.update(
+                at=at,
+                message=get_preview(message),
+                profile_name=message.get("profile_name") if message.get("type") == "Incoming" else None,
+            )
+        if count_unread and message.get("type") == "Incoming":
+            conversation["unread"] += 1
+
+    upsert(conversations)
+    inbox.record(conversations)
+    return conversations
+
+
+def upsert(conversations):
+    if not conversations:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user
+    rows = []
+    for conversation_id, conversation in conversations.items():
+        session, contact = conversation_id.split(":", 1)
+        rows.append((
+            conversation_id, now, now, user, user, 0, contact, session, conversation["profile_name"],
+            conversation["message"], conversation["at"], conversation["unread"],
+        ))
+
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[i:i + UPSERT_BATCH_SIZE]
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(batch))
+        # Assignments run left to right, last_message still sees the old last_message_at
+        frappe.db.sql(
+            f"""insert into `tabWhatsApp Conversation`
+            (name, creation, modified, owner, modified_by, docstatus, contact_number, session,
+            profile_name, last_message, last_message_at, unread_count)
+            values {placeholders}
+            on duplicate key update
+                last_message = if(values(last_message_at) >= last_message_at, values(last_message), last_message),
+                last_message_at = greatest(coalesce(last_message_at, values(last_message_at)), values(last_message_at)),
+                profile_name = coalesce(nullif(values(profile_name), ''), profile_name),
+                unread_count = unread_count + values(unread_count),
+                modified = values(modified)""",
+            [value for row in batch for value in row],
+        )
+
+
+def mark_read(conversation_id):
+    """Clear the unread count of a conversation."""
+    if conversation_id:
+        frappe.db.set_value("WhatsApp Conversation", conversation_id, "unread_count", 0, update_modified=False)
+        inbox.clear_unread(conversation_id)
+
+
+@frappe.whitelist()
+def get_chat_history(conversation_id, before=None, limit=PAGE_SIZE):
+    """Get messages of one conversation newest first.
+
+    Pass the returned `next_cursor` as `before` to get the next page.
+    """
+    frappe.has_permission("WhatsApp Message", "read", throw=True)
+    frappe.get_doc("WhatsApp Conversation", conversation_id).check_permission("read")
+
+    limit = min(cint(limit) or PAGE_SIZE, MAX_PAGE_SIZE)
+    values = {"conversation_id": conversation_id, "limit": limit}
+    cursor_condition = ""
+    if before:
+        values["creation"], values["name"] = before.split("|", 1)
+        cursor_condition = "and (creation, name) < (%(creation)s, %(name)s)"
+
+    columns = ", ".join(f"`{field}`" for field in HISTORY_FIELDS)
+    messages = frappe.db.sql(
+        f"""select {columns} from `tabWhatsApp Message`
+        where conversation_id = %(conversation_id)s {cursor_condition}
+        order by creation desc, name desc
+        limit %(limit)s""",
+        values,
+        as_dict=True,
+    )
+
+    if len(messages) < limit and message_archive.get_archive_tables():
+        # Older messages of the conversation were moved to the archive
+        messages += message_archive.get_messages(
+            {"conversation_id": conversation_id},
+            list(HISTORY_FIELDS),
+            limit - len(messages),
+            messages[-1].creation if messages else values.get("creation"),
+        )
+
+    return {
+        "messages": messages,
+        "next_cursor": f"{messages[-1].creation}|{messages[-1].name}" if len(messages) == limit else None,
+    }
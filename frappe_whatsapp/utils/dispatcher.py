@@ -0,0 +1,265 @@
+"""Priority lanes for queued outgoing messages."""
+import time
+
+import frappe
+from frappe.utils import add_to_date, cint, now_datetime
+
+LANES = {
+    "Transactional": {"queue": "short", "weight": 6},
+    "Notification": {"queue": "default", "weight": 3},
+    "Marketing": {"queue": "long", "weight": 1},
+}
+DEFAULT_LANE = "Transactional"
+UNLIMITED_BATCH = 5000
+SEND_CHUNK_SIZE = 100
+# Queued rows untouched for this long are assumed lost from Redis
+STALE_AFTER_MINUTES = 15
+REQUEUE_BATCH_SIZE = 1000
+POP_SCRIPT = """
+local names = redis.call('lrange', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #names > 0 then
+    redis.call('ltrim', KEYS[1], #names, -1)
+end
+return names
+"""
+
+
+def get_lane(priority):
+    """Get lane name for a message priority."""
+    return priority if priority in LANES else DEFAULT_LANE
+
+
+def outbox_key(lane):
+    return frappe.cache().make_key(f"whatsapp_outbox|{lane}")
+
+
+def delayed_key(lane):
+    return frappe.cache().make_key(f"whatsapp_outbox_delayed|{lane}")
+
+
+def budget_key(minute):
+    return frappe.cache().make_key(f"whatsapp_send_budget|{minute}")
+
+
+def push(names, priority=None, delay=0):
+    """Add persisted Queued messages to their lane once the transaction commits.
+
+    With a `delay` (seconds) the messages wait in the lane's delayed set and
+    are moved into the lane by the first dispatch after they fall due.
+    """
+    if not names:
+        return
+
+    def _push():
+        lane = get_lane(priority)
+        pipe = frappe.cache().pipeline()
+        if delay:
+            due = time.time() + delay
+            pipe.zadd(delayed_key(lane), {name: due for name in names})
+        else:
+            pipe.rpush(outbox_key(lane), *names)
+        pipe.execute()
+        if not delay:
+            kick()
+
+    frappe.db.after_commit.add(_push)
+
+
+def kick():
+    """Enqueue a dispatch run unless one is already waiting."""
+    frappe.enqueue(
+        "frappe_whatsapp.utils.dispatcher.dispatch",
+        queue="short",
+        job_id=f"whatsapp_dispatch|{frappe.local.site}",
+        deduplicate=True,
+    )
+
+
+def consume(count):
+    """Count sends against this minute's rate budget."""
+    key = budget_key(int(time.time() // 60))
+    pipe = frappe.cache().pipeline()
+    pipe.incrby(key, count)
+    pipe.expire(key, 120)
+    pipe.execute()
+
+
+def get_rate_settings():
+    """Get messages per minute (0 for unlimited) and the transactional reserved share."""
+    settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
+    return cint(settings.send_rate_limit), cint(settings.transactional_reserved_share)
+
+
+def dispatch():
+    """Release queued messages from each lane within this minute's rate budget."""
+    cache = frappe.cache()
+    lock = cache.make_key("whatsapp_dispatch_lock")
+    if not cache.set(lock, 1, nx=True, ex=50):
+        # Another dispatch run is active
+        return
+
+    try:
+        release(cache)
+    finally:
+        cache.delete(lock)
+
+
+def release(cache):
+    """Allocate this minute's budget and enqueue send jobs per lane."""
+    rate, reserved_share = get_rate_settings()
+    promote_due()
+
+    pipe = cache.pipeline()
+    for lane in LANES:
+        pipe.llen(outbox_key(lane))
+    backlog = dict(zip(LANES, pipe.execute()))
+    if not any(backlog.values()):
+        return
+
+    if rate:
+        used = cint(cache.get(budget_key(int(time.time() // 60))))
+        budget = max(rate - used, 0)
+    else:
+        budget = UNLIMITED_BATCH
+
+    allocation = allocate(budget, backlog, reserved_share)
+    released = 0
+    for lane, count in allocation.items():
+        names = pop(lane, count)
+        released += len(names)
+        for i in range(0, len(names), SEND_CHUNK_SIZE):
+            frappe.enqueue(
+                "frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_message.whatsapp_message.send_queued_messages",
+                queue=LANES[lane]["queue"],
+                names=names[i:i + SEND_CHUNK_SIZE],
+            )
+
+    if released:
+        consume(released)
+
+
+def promote_due():
+    """Move delayed messages that are due into their lanes."""
+    cache = frappe.cache()
+    now = time.time()
+    for lane in LANES:
+        due = cache.zrangebyscore(delayed_key(lane), "-inf", now)
+        if not due:
+            continue
+
+        pipe = cache.pipeline()
+        pipe.zrem(delayed_key(lane), *due)
+        pipe.rpush(outbox_key(lane), *due)
+        pipe.execute()
+
+
+def allocate(budget, backlog, reserved_share=0):
+    """Split the budget across lanes.
+
+    The transactional lane first gets its reserved share, the rest is handed out
+    by lane weight; budget a lane cannot use flows to the remaining lanes.
+    """
+    allocation = {lane: 0 for lane in LANES}
+    allocation[DEFAULT_LANE] = min(backlog.get(DEFAULT_LANE, 0), budget * reserved_share // 100)
+    remaining = budget - allocation[DEFAULT_LANE]
+
+    while remaining > 0:
+        active = [lane for lane in LANES if backlog.get(lane, 0) > allocation[lane]]
+        if not active:
+            break
+
+        total_weight = sum(LANES[lane]["weight"] for lane in active)
+        given = 0
+        for lane in active:
+            share = max(1, remaining * LANES[lane]["weight"] // total_weight)
+            share = min(share, backlog[lane] - allocation[lane], remaining - given)
+            allocation[lane] += share
+            given += share
+            if given >= remaining:
+                break
+
+        remaining -= given
+
+    return allocation
+
+
+def pop(lane, count):
+    """Atomically take up to `count` message names from the head of a lane."""
+    if count <= 0:
+        return []
+
+    cache = frappe.cache()
+    names = cache.register_script(POP_SCRIPT)(keys=[outbox_key(lane)], args=[count])
+    return [frappe.safe_decode(name) for name in names]
+
+
+def requeue_stale(bulk_message=None):
+    """Push Queued messages that Redis lost back into their lanes.
+
+    The lanes live in the cache Redis, which may evict or drop them. Lists are
+    evicted as a whole, so only lanes that are empty are refilled; rows still
+    waiting in a delayed set are left alone. Re-pushed rows get a fresh
+    `modified`, so a row is pushed at most once per `STALE_AFTER_MINUTES`.
+    """
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    for lane in LANES:
+        pipe.llen(outbox_key(lane))
+    empty_lanes = {lane for lane, length in zip(LANES, pipe.execute()) if not length}
+    if not empty_lanes:
+        return 0
+
+    conditions = ""
+    values = {
+        "cutoff": add_to_date(now_datetime(), minutes=-STALE_AFTER_MINUTES),
+        "limit": REQUEUE_BATCH_SIZE,
+    }
+    if bulk_message:
+        conditions = "and m.bulk_message_reference = %(bulk_message)s"
+        values["bulk_message"] = bulk_message
+
+    count = 0
+    last = None
+    while True:
+        keyset = ""
+        if last:
+            keyset = "and (m.modified, m.name) > (%(last_modified)s, %(last_name)s)"
+            values["last_modified"], values["last_name"] = last
+
+        rows = frappe.db.sql(
+            f"""select m.name, m.priority, m.modified
+            from `tabWhatsApp Message` m
+            left join `tabBulk WhatsApp Message` b on b.name = m.bulk_message_reference
+            where m.status = 'Queued' and m.type = 'Outgoing' and m.modified < %(cutoff)s
+                and (b.name is null or b.status != 'Paused') {conditions} {keyset}
+            order by m.modified, m.name
+            limit %(limit)s""",
+            values,
+            as_dict=True,
+        )
+        if not rows:
+            break
+        last = (rows[-1].modified, rows[-1].name)
+
+        rows = [row for row in rows if get_lane(row.priority) in empty_lanes]
+        pipe = cache.pipeline()
+        for row in rows:
+            pipe.zscore(delayed_key(get_lane(row.priority)), row.name)
+        lost = [row for row, score in zip(rows, pipe.execute()) if score is None]
+        if not lost:
+            continue
+
+        frappe.db.sql(
+            "update `tabWhatsApp Message` set modified = %s where name in %s",
+            (now_datetime(), [row.name for row in lost]),
+        )
+        by_lane = {}
+        for row in lost:
+            by_lane.setdefault(get_lane(row.priority), []).append(row.name)
+        for lane, names in by_lane.items():
+            push(names, lane)
+
+        frappe.db.commit()
+        count += len(lost)
+
+    return count
@@ -0,0 +1,195 @@
+"""Redis backed inbox of conversations ordered by last activity."""
+import datetime
+import json
+
+import frappe
+from frappe.utils import cint, get_datetime
+
+INBOX_KEY = "whatsapp_inbox"
+UNREAD_KEY = "whatsapp_inbox_unread"
+LAST_KEY = "whatsapp_inbox_last"
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+REBUILD_BATCH_SIZE = 5000
+
+
+def keys():
+    cache = frappe.cache()
+    return cache.make_key(INBOX_KEY), cache.make_key(UNREAD_KEY), cache.make_key(LAST_KEY)
+
+
+def record(conversations):
+    """Update inbox order, unread counters and previews once the transaction commits.
+
+    `conversations` maps conversation_id to the summary built by
+    `conversations.touch`.
+    """
+    if not conversations:
+        return
+
+    def _record():
+        inbox, unread, last = keys()
+        pipe = frappe.cache().pipeline()
+        for conversation_id, conversation in conversations.items():
+            at = get_datetime(conversation["at"])
+            pipe.zadd(inbox, {conversation_id: at.timestamp()})
+            if conversation["unread"]:
+                pipe.hincrby(unread, conversation_id, conversation["unread"])
+            pipe.hset(last, conversation_id, json.dumps({
+                "message": conversation["message"],
+                "at": str(at),
+                "profile_name": conversation.get("profile_name"),
+            }))
+        pipe.execute()
+
+    frappe.db.after_commit.add(_record)
+
+
+def clear_unread(conversation_id):
+    """Reset the unread counter of a conversation once the transaction commits."""
+    def _clear():
+        pipe = frappe.cache().pipeline()
+        pipe.hdel(keys()[1], conversation_id)
+        pipe.execute()
+
+    frappe.db.after_commit.add(_clear)
+
+
+@frappe.whitelist()
+def get_inbox(cursor=None, limit=PAGE_SIZE):
+    """Get conversations by last activity, newest first.
+
+    Pass the returned `next_cursor` as `cursor` to get the next page.
+    """
+    frappe.has_permission("WhatsApp Conversation", "read", throw=True)
+    limit = min(cint(limit) or PAGE_SIZE, MAX_PAGE_SIZE)
+
+    inbox, unread, last = keys()
+    cache = frappe.cache()
+    # Keys are already prefixed, go through a raw pipeline like the writes do
+    pipe = cache.pipeline()
+    pipe.exists(inbox)
+    (exists,) = pipe.execute()
+    if not exists:
+        frappe.enqueue(
+            "frappe_whatsapp.utils.inbox.rebuild_inbox",
+            queue="long",
+            job_id=f"whatsapp_inbox_rebuild|{frappe.local.site}",
+            deduplicate=True,
+        )
+        return get_inbox_from_db(cursor, limit)
+
+    page = get_page(inbox, cursor, limit)
+    if not page:
+        return {"conversations": [], "next_cursor": None}
+
+    names = [name for name, _ in page]
+    pipe = cache.pipeline()
+    pipe.hmget(unread, names)
+    pipe.hmget(last, names)
+    unread_counts, previews = pipe.execute()
+
+    conversations = []
+    for (name, score), count, preview in zip(page, unread_counts, previews):
+        preview = json.loads(preview) if preview else {}
+        session, contact = name.split(":", 1)
+        conversations.append({
+            "name": name,
+            "contact_number": contact,
+            "session": session,
+            "profile_name": preview.get("profile_name"),
+            "last_message": preview.get("message"),
+            "last_message_at": preview.get("at"),
+            "unread_count": cint(count),
+        })
+
+    name, score = page[-1]
+    return {
+        "conversations": conversations,
+        "next_cursor": f"{score}|{name}" if len(page) == limit else None,
+    }
+
+
+def get_page(inbox, cursor, limit):
+    """Read one page of (conversation_id, score) pairs after `cursor`."""
+    cache = frappe.cache()
+    if not cursor:
+        rows = cache.zrevrange(inbox, 0, limit - 1, withscores=True)
+        return [(frappe.safe_decode(name), score) for name, score in rows]
+
+    cursor_score, cursor_name = cursor.split("|", 1)
+    cursor_score = float(cursor_score)
+    page = []
+    offset = 0
+    # Members sharing the cursor score are skipped up to and including the cursor
+    while len(page) < limit:
+        rows = cache.zrevrangebyscore(inbox, cursor_score, "-inf", start=offset, num=limit, withscores=True)
+        if not rows:
+            break
+        offset += len(rows)
+        for name, score in rows:
+            name = frappe.safe_decode(name)
+            if score == cursor_score and name >= cursor_name:
+                continue
+            page.append((name, score))
+            if len(page) == limit:
+                break
+
+    return page
+
+
+def get_inbox_from_db(cursor, limit):
+    """Same page read from WhatsApp Conversation while the Redis inbox is rebuilt."""
+    conditions = ""
+    values = {"limit": limit}
+    if cursor:
+        score, name = cursor.split("|", 1)
+        values["at"], values["name"] = datetime.datetime.fromtimestamp(float(score)), name
+        conditions = "where (last_message_at, name) < (%(at)s, %(name)s)"
+
+    conversations = frappe.db.sql(
+        f"""select name, contact_number, session, profile_name, last_message, last_message_at, unread_count
+        from `tabWhatsApp Conversation` {conditions}
+        order by last_message_at desc, name desc limit %(limit)s""",
+        values,
+        as_dict=True,
+    )
+
+    next_cursor = None
+    if len(conversations) == limit:
+        last = conversations[-1]
+        next_cursor = f"{get_datetime(last.last_message_at).timestamp()}|{last.name}"
+
+    return {"conversations": conversations, "next_cursor": next_cursor}
+
+
+def rebuild_inbox():
+    """Load the inbox from WhatsApp Conversation after Redis lost it."""
+    inbox, unread, last = keys()
+    cache = frappe.cache()
+    last_name = ""
+    while True:
+        rows = frappe.get_all(
+            "WhatsApp Conversation",
+            filters={"name": [">", last_name]},
+            fields=["name", "profile_name", "last_message", "last_message_at", "unread_count"],
+            order_by="name asc",
+            limit_page_length=REBUILD_BATCH_SIZE
+        )
+        if not rows:
+            break
+        last_name = rows[-1].name
+
+        pipe = cache.pipeline()
+        for row in rows:
+            if not row.last_message_at:
+                continue
+            pipe.zadd(inbox, {row.name: get_datetime(row.last_message_at).timestamp()})
+            if row.unread_count:
+                pipe.hset(unread, row.name, row.unread_count)
+            pipe.hset(last, row.name, json.dumps({
+                "message": row.last_message,
+                "at": str(row.last_message_at),
+                "profile_name": row.profile_name,
+            }))
+        pipe.execute()
@@ -0,0 +1,79 @@
+"""Retention, sampling and archival of WhatsApp Notification Log entries."""
+import gzip
+import json
+import os
+import random
+
+import frappe
+from frappe.utils import add_days, cint, flt, now_datetime, nowdate
+
+LOG_DOCTYPE = "WhatsApp Notification Log"
+DELETE_BATCH_SIZE = 1000
+ARCHIVE_FOLDER = "whatsapp_log_archive"
+
+
+def get_retention_rules():
+    """Get retention rules by template and the default retention in days."""
+    settings = frappe.get_cached_doc("WhatsApp Settings")
+    rules = {rule.template: rule for rule in settings.get("log_retention_rules") or []}
+    return rules, cint(settings.default_log_retention_days)
+
+
+def should_log(template, error=False):
+    """Sample successful entries by their template's rate, errors are always logged."""
+    if error:
+        return True
+
+    rule = get_retention_rules()[0].get(template)
+    if not rule:
+        return True
+
+    rate = flt(rule.sample_rate)
+    return rate >= 100 or random.random() * 100 < rate
+
+
+def purge_logs():
+    """Delete (and optionally archive) log entries past their retention."""
+    rules, default_days = get_retention_rules()
+    for template, rule in rules.items():
+        if cint(rule.retention_days) > 0:
+            purge([["template", "=", template]], rule.retention_days, template if rule.archive else None)
+
+    if default_days > 0:
+        filters = [["template", "not in", list(rules)]] if rules else []
+        purge(filters, default_days)
+
+
+def purge(filters, retention_days, archive_as=None):
+    """Remove expired entries in small batches, committing after each one."""
+    filters = [*filters, ["creation", "<", add_days(now_datetime(), -cint(retention_days))]]
+    fields = ["name", "creation", "template", "meta_data"] if archive_as else ["name"]
+
+    while True:
+        rows = frappe.get_all(
+            LOG_DOCTYPE,
+            filters=filters,
+            fields=fields,
+            order_by="creation asc",
+            limit_page_length=DELETE_BATCH_SIZE
+        )
+        if not rows:
+            break
+
+        if archive_as:
+            archive(archive_as, rows)
+
+        frappe.db.delete(LOG_DOCTYPE, {"name": ["in", [row.name for row in rows]]})
+        frappe.db.commit()
+
+
+def archive(template, rows):
+    """Append entries to today's compressed JSONL archive of the template."""
+    folder = frappe.get_site_path("private", ARCHIVE_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{frappe.scrub(template)}-{nowdate()}.jsonl.gz")
+
+    # Appending adds a new gzip member, readers see one continuous stream
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, default=str) + "\n")
@@ -0,0 +1,102 @@
+"""Buffered writes for WhatsApp Notification Log entries."""
+import json
+
+import frappe
+from frappe.utils import now_datetime
+
+from frappe_whatsapp.utils.log_retention import LOG_DOCTYPE, should_log
+
+BUFFER_KEY = "whatsapp_log_buffer"
+FLUSH_BATCH_SIZE = 500
+LOG_FIELDS = ("name", "creation", "modified", "owner", "modified_by", "docstatus", "template", "meta_data")
+
+
+def buffer_key():
+    return frappe.cache().make_key(BUFFER_KEY)
+
+
+def log(template, meta_data, error=False):
+    """Record a log entry.
+
+    Successful entries are sampled and buffered in Redis, to be written in bulk
+    by `flush_logs`. Errors are written right away and re-buffered if the
+    transaction is rolled back, so they are never lost.
+    """
+    if not should_log(template, error):
+        return
+
+    entry = make_entry(template, meta_data)
+    if error:
+        insert_entries([entry])
+        frappe.db.after_rollback.add(lambda: buffer_entries([entry]))
+        return
+
+    buffer_entries([entry])
+
+
+def make_entry(template, meta_data):
+    now = str(now_datetime())
+    user = frappe.session.user if getattr(frappe.local, "session", None) else "Guest"
+    return {
+        "name": frappe.generate_hash(length=10),
+        "creation": now,
+        "modified": now,
+        "owner": user,
+        "modified_by": user,
+        "docstatus": 0,
+        "template": template,
+        "meta_data": meta_data if isinstance(meta_data, str) else json.dumps(meta_data, default=str),
+    }
+
+
+def buffer_entries(entries):
+    """Append entries to the Redis buffer, writing them directly if Redis is down."""
+    try:
+        # Raw pipeline: the key is already prefixed and the wrapper's rpush takes a single value
+        pipe = frappe.cache().pipeline()
+        pipe.rpush(buffer_key(), *(json.dumps(entry) for entry in entries))
+        (length,) = pipe.execute()
+    except Exception:
+        insert_entries(entries)
+        return
+
+    if length >= FLUSH_BATCH_SIZE:
+        frappe.enqueue(
+            "frappe_whatsapp.utils.log_writer.flush_logs",
+            queue="short",
+            job_id=f"whatsapp_log_flush|{frappe.local.site}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+        )
+
+
+def insert_entries(entries):
+    frappe.db.bulk_insert(
+        LOG_DOCTYPE,
+        fields=list(LOG_FIELDS),
+        values=[tuple(entry[field] for field in LOG_FIELDS) for entry in entries],
+        ignore_duplicates=True,
+    )
+
+
+def flush_logs():
+    """Write buffered entries with one insert per batch."""
+    cache = frappe.cache()
+    lock = cache.make_key("whatsapp_log_flush_lock")
+    if not cache.set(lock, 1, nx=True, ex=300):
+        return
+
+    try:
+        key = buffer_key()
+        while True:
+            pipe = cache.pipeline()
+            pipe.lrange(key, 0, FLUSH_BATCH_SIZE - 1)
+            pipe.ltrim(key, FLUSH_BATCH_SIZE, -1)
+            raw, _ = pipe.execute()
+            if not raw:
+                break
+
+            insert_entries([json.loads(item) for item in raw])
+            frappe.db.commit()
+    finally:
+        cache.delete(lock)
@@ -0,0 +1,80 @@
+"""Content-addressed cache of outgoing media payloads."""
+import base64
+import hashlib
+import mimetypes
+
+import frappe
+from frappe.utils import cint, get_url
+
+CACHE_EXPIRY = 24 * 3600
+
+
+def get_media_file(attach, mimetype=None, filename=None):
+    """Get WAHA `file` payload for an attachment, reading local files only once."""
+    payload = {}
+    if mimetype:
+        payload["mimetype"] = mimetype
+    if filename:
+        payload["filename"] = filename
+
+    if not attach or attach.startswith("http"):
+        payload["url"] = attach
+        return payload
+
+    entry = get_cached_media(attach)
+    if entry.get("data"):
+        payload.setdefault("mimetype", entry["mimetype"])
+        payload["data"] = entry["data"]
+    else:
+        payload["url"] = entry["url"]
+
+    return payload
+
+
+def get_cached_media(attach):
+    """Get cache entry for a local file, keyed by its content hash."""
+    file_doc = get_file(attach)
+    cache = frappe.cache()
+    content_hash = cache.get_value(f"whatsapp_media_hash|{attach}")
+    entry = content_hash and cache.get_value(f"whatsapp_media|{content_hash}")
+    if entry:
+        return entry
+
+    content = file_doc.get_content()
+    if isinstance(content, str):
+        content = content.encode()
+
+    content_hash = hashlib.sha256(content).hexdigest()
+    entry = cache.get_value(f"whatsapp_media|{content_hash}")
+    if not entry:
+        entry = make_cache_entry(attach, content, content_hash)
+        cache.set_value(f"whatsapp_media|{content_hash}", entry, expires_in_sec=CACHE_EXPIRY)
+
+    cache.set_value(f"whatsapp_media_hash|{attach}", content_hash, expires_in_sec=CACHE_EXPIRY)
+    return entry
+
+
+def get_file(attach):
+    """Get the File of an attachment, checking read permission on private files.
+
+    The check runs before the cache lookup, so a cached entry never hands a
+    private file to a user who could not read it.
+    """
+    file_doc = frappe.get_doc("File", {"file_url": attach})
+    if file_doc.is_private:
+        frappe.has_permission("File", "read", file_doc, throw=True)
+    return file_doc
+
+
+def make_cache_entry(attach, content, content_hash):
+    """Inline small files as base64, point WAHA at a stable URL for the rest."""
+    settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
+    max_inline_size = cint(settings.media_inline_max_size) * 1024 * 1024
+
+    if len(content) <= max_inline_size:
+        return {
+            "mimetype": mimetypes.guess_type(attach)[0] or "application/octet-stream",
+            "data": base64.b64encode(content).decode(),
+        }
+
+    return {"url": f"{get_url(attach)}?v={content_hash[:16]}"}
@@ -0,0 +1,171 @@
+"""Monthly archive tables for old WhatsApp Message rows."""
+import frappe
+from frappe import _
+from frappe.desk.reportview import get_match_cond
+from frappe.utils import add_days, cint, get_datetime, now_datetime
+
+MESSAGE_TABLE = "tabWhatsApp Message"
+ARCHIVE_PREFIX = "WhatsApp Message Archive "
+ARCHIVE_BATCH_SIZE = 1000
+MAX_PAGE_SIZE = 500
+FILTER_OPERATORS = ("=", "!=", "<", ">", "<=", ">=", "in", "like")
+STANDARD_FIELDS = ("name", "creation", "modified", "owner")
+
+
+def archive_table(month):
+    """Table name for the archive of `month` (YYYYMM)."""
+    return f"tab{ARCHIVE_PREFIX}{month}"
+
+
+def get_archive_tables():
+    """Archive tables, newest month first."""
+    prefix = f"tab{ARCHIVE_PREFIX}"
+    return sorted((table for table in frappe.db.get_tables(cached=False) if table.startswith(prefix)), reverse=True)
+
+
+def archive_messages():
+    """Move settled messages past the configured age into their month's archive table."""
+    days = cint(frappe.db.get_single_value("WhatsApp Settings", "archive_messages_after_days"))
+    if days <= 0:
+        return
+
+    cutoff = add_days(now_datetime(), -days)
+    column_list = ", ".join(f"`{column}`" for column, _ in get_columns(MESSAGE_TABLE))
+    # Older months are read with the current fields too, keep every archive in step
+    synced = set(get_archive_tables())
+    for table in synced:
+        sync_columns(table)
+
+    while True:
+        rows = frappe.get_all(
+            "WhatsApp Message",
+            filters={"creation": ["<", cutoff], "status": ["!=", "Queued"]},
+            fields=["name", "creation"],
+            order_by="creation asc",
+            limit_page_length=ARCHIVE_BATCH_SIZE
+        )
+        if not rows:
+            break
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(get_datetime(row.creation).strftime("%Y%m"), []).append(row.name)
+
+        for month, names in by_month.items():
+            table = archive_table(month)
+            if table not in synced:
+                frappe.db.sql_ddl(f"create table if not exists `{table}` like `{MESSAGE_TABLE}`")
+                synced.add(table)
+
+            frappe.db.sql(
+                f"""insert ignore into `{table}` ({column_list})
+                select {column_list} from `{MESSAGE_TABLE}` where name in %(names)s""",
+                {"names": names},
+            )
+            frappe.db.delete("WhatsApp Message", {"name": ["in", names]})
+
+        frappe.db.commit()
+
+
+def get_columns(table):
+    """(name, type) of every column of `table` in table order."""
+    return frappe.db.sql(
+        """select column_name, column_type from information_schema.columns
+        where table_schema = database() and table_name = %s
+        order by ordinal_position""",
+        table,
+    )
+
+
+def sync_columns(table):
+    """Add columns WhatsApp Message gained since `table` was created.
+
+    Added as nullable, rows archived earlier have no value for them. Columns
+    dropped from WhatsApp Message stay in the archive.
+    """
+    existing = {column for column, _ in get_columns(table)}
+    for column, column_type in get_columns(MESSAGE_TABLE):
+        if column not in existing:
+            frappe.db.sql_ddl(f"alter table `{table}` add column `{column}` {column_type} null")
+
+
+def get_messages(filters=None, fields=None, limit=100, before=None):
+    """Get messages newest first from the hot table, then from the archives.
+
+    `filters` is a dict of field to value or [operator, value]. Pass the
+    `creation` of the last row as `before` to get the next page.
+    """
+    limit = min(cint(limit) or 100, MAX_PAGE_SIZE)
+    fields = fields or ["name", "creation", "type", "from", "to", "message", "content_type", "status", "message_id"]
+    conditions, values = build_conditions(filters or {}, fields, before)
+
+    messages = frappe.get_list(
+        "WhatsApp Message",
+        filters=[*filters_as_list(filters or {}), *([["creation", "<", before]] if before else [])],
+        fields=fields,
+        order_by="creation desc",
+        limit_page_length=limit
+    )
+
+    columns = ", ".join(f"`{field}`" for field in fields)
+    for table in get_archive_tables():
+        if len(messages) >= limit:
+            break
+
+        values["limit"] = limit - len(messages)
+        messages += frappe.db.sql(
+            f"""select {columns} from `{table}`
+            where {conditions} {get_permission_conditions(table)}
+            order by creation desc limit %(limit)s""",
+            values,
+            as_dict=True,
+        )
+
+    return messages
+
+
+def get_permission_conditions(table=MESSAGE_TABLE):
+    """WhatsApp Message match conditions of the session user, rewritten for `table`.
+
+    Covers User Permissions, if_owner and permission query conditions, so
+    rows keep their restrictions once archived. Empty for unrestricted users.
+    """
+    conditions = get_match_cond("WhatsApp Message")
+    return conditions.replace(f"`{MESSAGE_TABLE}`", f"`{table}`") if table != MESSAGE_TABLE else conditions
+
+
+def filters_as_list(filters):
+    return [
+        [field, *value] if isinstance(value, (list, tuple)) else [field, "=", value]
+        for field, value in filters.items()
+    ]
+
+
+def build_conditions(filters, fields, before=None):
+    """Build a parameterized where clause for archive tables, checking every field name."""
+    valid_fields = set(STANDARD_FIELDS) | {df.fieldname for df in frappe.get_meta("WhatsApp Message").fields}
+    for field in [*fields, *filters]:
+        if field not in valid_fields:
+            frappe.throw(_("Invalid field {0}").format(field))
+
+    conditions = ["1 = 1"]
+    values = {}
+    for i, (field, operator, value) in enumerate(filters_as_list(filters)):
+        if operator not in FILTER_OPERATORS:
+            frappe.throw(_("Invalid operator {0}").format(operator))
+        # Tuples are rendered as a parenthesized list by the driver
+        conditions.append(f"`{field}` {operator} %(value{i})s")
+        values[f"value{i}"] = tuple(value) if operator == "in" else value
+
+    if before:
+        conditions.append("creation < %(before)s")
+        values["before"] = before
+
+    return " and ".join(conditions), values
+
+
+@frappe.whitelist()
+def get_message_history(filters=None, fields=None, limit=100, before=None):
+    """Read messages including archived ones"""
+    frappe.has_permission("WhatsApp Message", "read", throw=True)
+    return get_messages(frappe.parse_json(filters), frappe.parse_json(fields), limit, before)
@@ -0,0 +1,108 @@
+"""Ranked search over WhatsApp Message bodies."""
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, getdate
+
+from frappe_whatsapp.utils.conversations import get_session
+from frappe_whatsapp.utils.message_archive import get_permission_conditions
+from frappe_whatsapp.utils.phone import normalize
+
+MESSAGE_TABLE = "tabWhatsApp Message"
+FULLTEXT_INDEX = "message_fulltext"
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+RESULT_FIELDS = ("name", "creation", "type", "from", "to", "message", "content_type", "status", "conversation_id")
+
+
+def has_fulltext_index():
+    return frappe.db.has_index(MESSAGE_TABLE, FULLTEXT_INDEX)
+
+
+def is_fulltext_enabled():
+    return bool(frappe.db.get_single_value("WhatsApp Settings", "enable_fulltext_search"))
+
+
+def sync_fulltext_index():
+    """Nightly job: build the index when search is enabled, drop it when disabled."""
+    if is_fulltext_enabled():
+        ensure_fulltext_index()
+    else:
+        drop_fulltext_index()
+
+
+def ensure_fulltext_index():
+    """Build the FULLTEXT index on message bodies unless it exists.
+
+    The first FULLTEXT index of a table rebuilds it. MariaDB cannot do that
+    with LOCK=NONE, so reads continue but writes to WhatsApp Message wait
+    until the build is done. It therefore only runs from the nightly job.
+    """
+    if frappe.db.db_type != "mariadb" or has_fulltext_index():
+        return
+
+    frappe.db.sql_ddl(
+        f"""alter table `{MESSAGE_TABLE}` add fulltext index `{FULLTEXT_INDEX}` (`message`),
+        algorithm=inplace, lock=shared"""
+    )
+
+
+def drop_fulltext_index():
+    """Drop the FULLTEXT index, its upkeep slows down every message insert."""
+    if frappe.db.db_type != "mariadb" or not has_fulltext_index():
+        return
+
+    frappe.db.sql_ddl(f"alter table `{MESSAGE_TABLE}` drop index `{FULLTEXT_INDEX}`, algorithm=inplace, lock=none")
+
+
+@frappe.whitelist()
+def search_messages(query, number=None, from_date=None, to_date=None, direction=None, limit=PAGE_SIZE, start=0):
+    """Search message bodies, best match first when the FULLTEXT index is enabled and built.
+
+    `direction` is Incoming or Outgoing. Without the index, matches are
+    returned newest first using LIKE.
+    """
+    frappe.has_permission("WhatsApp Message", "read", throw=True)
+    if not query or not query.strip():
+        frappe.throw(_("Search query is required"))
+
+    limit = min(cint(limit) or PAGE_SIZE, MAX_PAGE_SIZE)
+    values = {"query": query.strip(), "limit": limit, "start": cint(start)}
+    conditions = []
+
+    if number:
+        values["conversation_id"] = f"{get_session()}:{normalize(number) or number}"
+        conditions.append("conversation_id = %(conversation_id)s")
+    if from_date:
+        values["from_date"] = getdate(from_date)
+        conditions.append("creation >= %(from_date)s")
+    if to_date:
+        values["to_date"] = add_days(getdate(to_date), 1)
+        conditions.append("creation < %(to_date)s")
+    if direction:
+        if direction not in ("Incoming", "Outgoing"):
+            frappe.throw(_("Direction must be Incoming or Outgoing"))
+        values["direction"] = direction
+        conditions.append("type = %(direction)s")
+
+    columns = ", ".join(f"`{field}`" for field in RESULT_FIELDS)
+    if is_fulltext_enabled() and has_fulltext_index():
+        match = "match(message) against (%(query)s in natural language mode)"
+        select = f"{columns}, {match} as score"
+        conditions.append(match)
+        order_by = "score desc"
+    else:
+        escaped = values["query"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        values["like"] = f"%{escaped}%"
+        select = columns
+        conditions.append("message like %(like)s")
+        order_by = "creation desc"
+
+    # Same User Permissions, if_owner and permission query conditions as the list view
+    return frappe.db.sql(
+        f"""select {select} from `{MESSAGE_TABLE}`
+        where {" and ".join(conditions)} {get_permission_conditions()}
+        order by {order_by}
+        limit %(limit)s offset %(start)s""",
+        values,
+        as_dict=True,
+    )
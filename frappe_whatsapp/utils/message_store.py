@@ -0,0 +1,60 @@
+"""Hook-free persistence for system generated WhatsApp Messages."""
+import frappe
+from frappe.utils import now_datetime
+
+from frappe_whatsapp.utils import contacts, conversations
+
+MESSAGE_FIELDS = (
+    "type",
+    "status",
+    "to",
+    "from",
+    "message",
+    "message_type",
+    "priority",
+    "message_id",
+    "content_type",
+    "attach",
+    "reference_doctype",
+    "reference_name",
+    "bulk_message_reference",
+    "bulk_message_chunk",
+    "idempotency_key",
+    "conversation_id",
+)
+
+
+def bulk_insert_messages(messages, chunk_size=1000):
+    """Insert WhatsApp Message rows in batches, skipping validation and doc hooks.
+
+    Only use this for messages generated by the system (already sent or queued
+    for the dispatcher); user facing sends should keep going through `insert()`.
+    Returns the generated names in the same order as `messages`.
+    """
+    now = now_datetime()
+    user = frappe.session.user
+    session = conversations.get_session()
+
+    names = []
+    values = []
+    for message in messages:
+        if not message.get("conversation_id"):
+            message["conversation_id"] = conversations.get_conversation_id(message, session)
+        name = frappe.generate_hash(length=10)
+        names.append(name)
+        values.append(
+            (name, now, now, user, user, 0)
+            + tuple(message.get(field) for field in MESSAGE_FIELDS)
+        )
+
+    if values:
+        frappe.db.bulk_insert(
+            "WhatsApp Message",
+            fields=["name", "creation", "modified", "owner", "modified_by", "docstatus", *MESSAGE_FIELDS],
+            values=values,
+            chunk_size=chunk_size,
+        )
+        conversations.touch(messages)
+        contacts.record(messages)
+
+    return names
@@ -0,0 +1,118 @@
+"""E.164 phone number normalization shared by every sender."""
+from functools import lru_cache
+
+import frappe
+import requests
+from frappe import _
+
+CHAT_SUFFIXES = ("@c.us", "@g.us")
+# Longest national number we expect to be missing its country code
+MAX_NATIONAL_LENGTH = 10
+EXISTS_CACHE_TTL = 7 * 24 * 3600
+
+
+def get_default_country_code():
+    """Default country calling code from WhatsApp Settings, digits only."""
+    code = frappe.db.get_single_value("WhatsApp Settings", "default_country_code") or ""
+    return "".join(char for char in code if char.isdigit())
+
+
+def normalize(number, country_code=None):
+    """Return `number` in E.164 format (+<digits>) or None if it is not valid."""
+    if country_code is None:
+        country_code = get_default_country_code()
+    return _normalize(str(number or ""), country_code)
+
+
+def normalize_many(numbers):
+    """Normalize a batch of numbers, reading the default country code once."""
+    country_code = get_default_country_code()
+    return [_normalize(str(number or ""), country_code) for number in numbers]
+
+
+@lru_cache(maxsize=8192)
+def _normalize(number, country_code):
+    number = number.strip()
+    international = number.startswith("+")
+    digits = "".join(char for char in number if char.isascii() and char.isdigit())
+
+    if not international and digits.startswith("00"):
+        # International call prefix
+        digits = digits[2:]
+        international = True
+
+    if not international and country_code and (
+        digits.startswith("0") or len(digits) <= MAX_NATIONAL_LENGTH
+    ):
+        digits = country_code + digits.lstrip("0")
+
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+
+    return f"+{digits}"
+
+
+def from_chat_id(chat_id):
+    """Normalize a number taken from a WAHA chatId.
+
+    ChatIds hold international numbers without the '+', so the default
+    country code must never be added to them.
+    """
+    number = str(chat_id or "").split("@", 1)[0].strip().lstrip("+")
+    return normalize(f"+{number}") if number else None
+
+
+def to_chat_id(number):
+    """Format a number as a WAHA chatId, throwing for invalid numbers.
+
+    Numbers taken from a chatId must be passed with their '+' (see
+    `from_chat_id`), otherwise they are read as national numbers.
+    """
+    if number and number.endswith(CHAT_SUFFIXES):
+        return number
+
+    normalized = normalize(number)
+    if not normalized:
+        frappe.throw(_("Invalid mobile number {0}").format(number))
+
+    return f"{normalized[1:]}@c.us"
+
+
+def number_exists(number):
+    """Check with WAHA whether `number` has a WhatsApp account.
+
+    Only active when enabled in WhatsApp Settings. Answers are cached, and
+    lookup errors count as existing so sending is never blocked by them.
+    """
+    settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
+    if not settings.check_number_exists or not settings.waha_url:
+        return True
+
+    normalized = normalize(number)
+    if not normalized:
+        return False
+
+    key = f"whatsapp_number_exists|{normalized}"
+    cached = frappe.cache().get_value(key)
+    if cached is not None:
+        return bool(cached)
+
+    headers = {}
+    api_key = settings.get_password("api_key", raise_exception=False)
+    if api_key:
+        headers["X-Api-Key"] = api_key
+
+    try:
+        response = requests.get(
+            f"{settings.waha_url.rstrip('/')}/api/contacts/check-exists",
+            params={"phone": normalized[1:], "session": settings.session_name or "default"},
+            headers=headers,
+            timeout=10,
+        )
+        response.raise_for_status()
+        exists = bool(response.json().get("numberExists"))
+    except (requests.exceptions.RequestException, ValueError):
+        return True
+
+    frappe.cache().set_value(key, int(exists), expires_in_sec=EXISTS_CACHE_TTL)
+    return exists
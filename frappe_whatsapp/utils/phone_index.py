@@ -0,0 +1,202 @@
+"""Normalized phone number index linking numbers to Frappe records."""
+import frappe
+from frappe import _
+from frappe.utils import now_datetime
+
+from frappe_whatsapp.utils.phone import from_chat_id, get_default_country_code, normalize
+
+INDEX_DOCTYPE = "WhatsApp Phone Index"
+SOURCE_MAP_KEY = "whatsapp_phone_index_sources"
+INDEX_FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "number", "reference_doctype", "reference_name", "priority",
+)
+REBUILD_BATCH_SIZE = 1000
+
+
+def get_source_map():
+    """Get configured phone fields grouped by doctype, in priority order."""
+    return frappe.cache().get_value(SOURCE_MAP_KEY, generator=build_source_map)
+
+
+def build_source_map():
+    if not frappe.db.table_exists("WhatsApp Phone Index Source"):
+        return {}
+
+    source_map = {}
+    for source in frappe.get_all(
+        "WhatsApp Phone Index Source",
+        filters={"parent": "WhatsApp Settings", "parenttype": "WhatsApp Settings"},
+        fields=["reference_doctype", "phone_field", "idx"],
+        order_by="idx asc",
+    ):
+        source_map.setdefault(source.reference_doctype, []).append({
+            "phone_field": source.phone_field,
+            "priority": source.idx,
+        })
+
+    return source_map
+
+
+def get_source_error(doctype, phone_field):
+    """Why a source cannot be indexed, None if it is valid."""
+    if not doctype or not frappe.db.exists("DocType", doctype):
+        return _("DocType {0} does not exist").format(doctype)
+
+    meta = frappe.get_meta(doctype)
+    if "." in (phone_field or ""):
+        table_field, phone_field = phone_field.split(".", 1)
+        df = meta.get_field(table_field)
+        if not df or df.fieldtype not in frappe.model.table_fields:
+            return _("{0} is not a table field of {1}").format(table_field, doctype)
+        meta = frappe.get_meta(df.options)
+
+    if not phone_field or not meta.has_field(phone_field):
+        return _("{0} is not a field of {1}").format(phone_field, meta.name)
+
+    return None
+
+
+def clear_source_map():
+    frappe.cache().delete_value(SOURCE_MAP_KEY)
+
+
+def update_phone_index(doc, method=None):
+    """Re-index the numbers of `doc` if its doctype is a configured source."""
+    if frappe.flags.in_install or frappe.flags.in_migrate or frappe.flags.in_uninstall:
+        return
+
+    sources = get_source_map().get(doc.doctype)
+    if not sources:
+        return
+
+    remove(doc.doctype, doc.name)
+    if method == "on_trash":
+        return
+
+    country_code = get_default_country_code()
+    rows = []
+    for source in sources:
+        for number in get_numbers(doc, source["phone_field"], country_code):
+            rows.append((number, doc.doctype, doc.name, source["priority"]))
+    insert(rows)
+
+
+def get_numbers(doc, phone_field, country_code):
+    """Normalized numbers of a field, `table_field.phone_field` reads a child table."""
+    if "." in phone_field:
+        table_field, field = phone_field.split(".", 1)
+        values = [row.get(field) for row in doc.get(table_field) or []]
+    else:
+        values = [doc.get(phone_field)]
+
+    return {number for number in (normalize(value, country_code) for value in values if value) if number}
+
+
+def insert(rows):
+    if not rows:
+        return
+
+    now = now_datetime()
+    frappe.db.bulk_insert(
+        INDEX_DOCTYPE,
+        fields=list(INDEX_FIELDS),
+        values=[
+            (frappe.generate_hash(length=10), now, now, "Administrator", "Administrator", 0, *row)
+            for row in rows
+        ],
+        chunk_size=REBUILD_BATCH_SIZE,
+    )
+
+
+def remove(doctype, name):
+    frappe.db.delete(INDEX_DOCTYPE, {"reference_doctype": doctype, "reference_name": name})
+
+
+def lookup(number, international=False):
+    """Get the record a number belongs to, None if it is not indexed.
+
+    Pass `international` for numbers that came from a WAHA chatId.
+    """
+    if not get_source_map():
+        return None
+
+    number = from_chat_id(number) if international else normalize(number)
+    if not number:
+        return None
+
+    rows = frappe.get_all(
+        INDEX_DOCTYPE,
+        filters={"number": number},
+        fields=["reference_doctype", "reference_name"],
+        order_by="priority asc",
+        limit_page_length=1,
+    )
+    return rows[0] if rows else None
+
+
+def rebuild_phone_index():
+    """Rebuild the whole index from the configured sources."""
+    clear_source_map()
+    frappe.db.delete(INDEX_DOCTYPE)
+    frappe.db.commit()
+
+    country_code = get_default_country_code()
+    for doctype, sources in get_source_map().items():
+        for source in sources:
+            # One broken source must not leave the others unindexed after the wipe
+            error = get_source_error(doctype, source["phone_field"])
+            if error:
+                frappe.log_error("WhatsApp Phone Index Error", error)
+                continue
+
+            try:
+                rebuild_source(doctype, source, country_code)
+            except Exception:
+                frappe.db.rollback()
+                frappe.log_error(
+                    "WhatsApp Phone Index Error",
+                    f"Error indexing {doctype} {source['phone_field']}\n\n{frappe.get_traceback()}"
+                )
+
+
+def rebuild_source(doctype, source, country_code):
+    """Index one phone field of a doctype in keyset batches."""
+    table_field, field = source["phone_field"].split(".", 1) if "." in source["phone_field"] else (None, source["phone_field"])
+    child_doctype = frappe.get_meta(doctype).get_field(table_field).options if table_field else None
+
+    last_name = ""
+    while True:
+        names = frappe.get_all(
+            doctype,
+            filters={"name": [">", last_name]},
+            order_by="name asc",
+            limit_page_length=REBUILD_BATCH_SIZE,
+            pluck="name"
+        )
+        if not names:
+            break
+        last_name = names[-1]
+
+        if child_doctype:
+            values = frappe.get_all(
+                child_doctype,
+                filters={"parent": ["in", names], "parenttype": doctype, "parentfield": table_field},
+                fields=["parent", field],
+                as_list=True,
+            )
+        else:
+            values = frappe.get_all(
+                doctype,
+                filters={"name": ["in", names]},
+                fields=["name", field],
+                as_list=True,
+            )
+
+        rows = set()
+        for name, value in values:
+            number = normalize(value, country_code) if value else None
+            if number:
+                rows.add((number, doctype, name, source["priority"]))
+        insert(list(rows))
+        frappe.db.commit()
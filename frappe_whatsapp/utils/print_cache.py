@@ -0,0 +1,131 @@
+"""Cache of rendered print PDFs sent as WhatsApp attachments."""
+import hashlib
+import hmac
+import os
+import time
+from urllib.parse import urlencode
+
+import frappe
+from frappe.utils import cint, get_url
+from frappe.utils.password import get_encryption_key
+
+CACHE_FOLDER = "whatsapp_print_cache"
+
+
+def get_cache_dir():
+    """Get (and create) the private folder holding cached PDFs."""
+    path = frappe.get_site_path("private", CACHE_FOLDER)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_cache_key(doctype, name, print_format, modified):
+    """Build cache key for one version of a printed document."""
+    raw = f"{doctype}|{name}|{print_format}|{modified}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cache_settings():
+    """Get TTL (seconds) and max size (bytes) of the cache."""
+    settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
+    ttl = cint(settings.print_cache_ttl) or 24
+    max_size = cint(settings.print_cache_max_size) or 512
+    return ttl * 3600, max_size * 1024 * 1024
+
+
+def get_print_pdf_url(doc, print_format):
+    """Render the print PDF once per document version and return a signed URL."""
+    key = get_cache_key(doc.doctype, doc.name, print_format, doc.modified)
+    path = os.path.join(get_cache_dir(), f"{key}.pdf")
+
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        render_print_pdf(doc, print_format, path)
+
+    return make_url(key, doc.name)
+
+
+def get_cached_pdf_url(doc, print_format):
+    """Signed URL of an already rendered PDF, None on a cache miss."""
+    key = get_cache_key(doc.doctype, doc.name, print_format, doc.modified)
+    path = os.path.join(get_cache_dir(), f"{key}.pdf")
+    if not os.path.exists(path):
+        return None
+
+    os.utime(path)
+    return make_url(key, doc.name)
+
+
+def make_url(key, name):
+    ttl, _ = get_cache_settings()
+    return get_signed_url(key, f"{name}.pdf", int(time.time()) + ttl)
+
+
+def render_print_pdf(doc, print_format, path):
+    """Render print format to PDF and write it atomically to the cache."""
+    pdf = frappe.get_print(doc.doctype, doc.name, print_format, doc=doc, as_pdf=True)
+    tmp_path = f"{path}.{frappe.generate_hash(length=8)}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+
+
+def get_signature(key, expires, filename=""):
+    """Sign a cache key and download filename with the site encryption key."""
+    message = f"{key}:{expires}:{filename}".encode()
+    return hmac.new(get_encryption_key().encode(), message, hashlib.sha256).hexdigest()
+
+
+def get_signed_url(key, filename, expires):
+    """Build a download URL that is valid until `expires`."""
+    query = urlencode({
+        "key": key,
+        "expires": expires,
+        "filename": filename,
+        "signature": get_signature(key, expires, filename),
+    })
+    return f"{get_url()}/api/method/frappe_whatsapp.utils.print_cache.download?{query}"
+
+
+@frappe.whitelist(allow_guest=True)
+def download(key, expires, signature, filename=None):
+    """Serve a cached PDF to WAHA without rendering it again."""
+    if cint(expires) < time.time():
+        frappe.throw("Link expired", frappe.PermissionError)
+
+    if not hmac.compare_digest(signature, get_signature(key, cint(expires), filename or "")):
+        frappe.throw("Invalid signature", frappe.PermissionError)
+
+    path = os.path.join(get_cache_dir(), f"{os.path.basename(key)}.pdf")
+    if not os.path.exists(path):
+        frappe.throw("File not found", frappe.DoesNotExistError)
+
+    with open(path, "rb") as f:
+        frappe.local.response.filecontent = f.read()
+    frappe.local.response.filename = filename or f"{key}.pdf"
+    frappe.local.response.type = "pdf"
+
+
+def evict_print_cache():
+    """Remove expired PDFs, then the oldest ones until the cache fits its size limit."""
+    ttl, max_size = get_cache_settings()
+    cache_dir = get_cache_dir()
+    now = time.time()
+
+    files = []
+    for entry in os.scandir(cache_dir):
+        if not entry.is_file():
+            continue
+        stat = entry.stat()
+        if now - stat.st_mtime > ttl:
+            os.remove(entry.path)
+        else:
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        os.remove(path)
+        total -= size
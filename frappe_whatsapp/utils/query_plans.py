@@ -0,0 +1,67 @@
+"""EXPLAIN checks for the hot WhatsApp Message queries."""
+import frappe
+
+# Access paths that must be served by an index: (query, values, expected index)
+HOT_QUERIES = {
+    "message ack": (
+        "select name from `tabWhatsApp Message` where message_id = %s limit 1",
+        ("x",),
+        "unique_message_id",
+    ),
+    "campaign status": (
+        "select count(*) from `tabWhatsApp Message` where bulk_message_reference = %s and status = %s",
+        ("x", "Queued"),
+        "bulk_message_reference_status_index",
+    ),
+    "chat from": (
+        "select name from `tabWhatsApp Message` where `from` = %s order by creation desc limit 20",
+        ("x",),
+        "from_creation_index",
+    ),
+    "chat to": (
+        "select name from `tabWhatsApp Message` where `to` = %s order by creation desc limit 20",
+        ("x",),
+        "to_creation_index",
+    ),
+    "document messages": (
+        "select name from `tabWhatsApp Message` where reference_doctype = %s and reference_name = %s",
+        ("x", "x"),
+        "reference_doctype_reference_name_index",
+    ),
+}
+
+
+def get_plans():
+    """Yield (name, expected index, EXPLAIN row) for every hot query."""
+    for label, (query, values, index) in HOT_QUERIES.items():
+        for row in frappe.db.sql(f"explain {query}", values, as_dict=True):
+            yield label, index, row
+
+
+def get_full_scans():
+    """Hot queries whose plan is a full table scan, as (name, possible_keys).
+
+    Scans are reported even when an index was available: possible_keys then
+    names the index the optimizer ignored. On small tables the optimizer
+    may prefer a scan, so use this on production sized data.
+    """
+    return [
+        (label, row.get("possible_keys"))
+        for label, _, row in get_plans()
+        if (row.get("type") or "").upper() == "ALL"
+    ]
+
+
+def get_missing_indexes():
+    """Hot queries whose expected index is not usable by their plan, as (name, index)."""
+    missing = []
+    for label, index, row in get_plans():
+        if not row.get("type"):
+            # Answered without reading the table, e.g. a unique key lookup that found nothing
+            continue
+
+        possible_keys = (row.get("possible_keys") or "").split(",")
+        if index not in possible_keys and row.get("key") != index:
+            missing.append((label, index))
+
+    return missing
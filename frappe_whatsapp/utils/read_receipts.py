@@ -0,0 +1,111 @@
+"""Debounced, per-chat read receipts for incoming messages."""
+import time
+
+import frappe
+from frappe.utils import cint
+
+from frappe_whatsapp.utils.conversations import mark_read
+
+DUE_KEY = "whatsapp_read_receipts_due"
+PENDING_KEY = "whatsapp_read_receipts_pending"
+ATTEMPTS_KEY = "whatsapp_read_receipts_attempts"
+DEFAULT_DELAY = 5
+RETRY_DELAY = 60
+MAX_ATTEMPTS = 5
+
+
+def due_key():
+    return frappe.cache().make_key(DUE_KEY)
+
+
+def attempts_key():
+    return frappe.cache().make_key(ATTEMPTS_KEY)
+
+
+def pending_key(chat_id):
+    return frappe.cache().make_key(f"{PENDING_KEY}|{chat_id}")
+
+
+def get_delay():
+    return cint(frappe.db.get_single_value("WhatsApp Settings", "read_receipt_delay")) or DEFAULT_DELAY
+
+
+def schedule(message_doc, chat_id):
+    """Mark the chat of `message_doc` as read once it has been quiet for the delay.
+
+    Every new message of the chat pushes the read receipt back. Due chats are
+    sent by the per-minute `flush_read_receipts` cron.
+    """
+    due = time.time() + get_delay()
+
+    def _schedule():
+        pipe = frappe.cache().pipeline()
+        pipe.sadd(pending_key(chat_id), message_doc.name)
+        pipe.zadd(due_key(), {chat_id: due})
+        pipe.execute()
+
+    frappe.db.after_commit.add(_schedule)
+
+
+def flush_read_receipts():
+    """Send one sendSeen per chat that is due, chats still in their delay wait for the next run."""
+    cache = frappe.cache()
+    for chat_id in cache.zrangebyscore(due_key(), "-inf", time.time()):
+        # Only the worker that removes the entry sends the receipt
+        if cache.zrem(due_key(), chat_id):
+            send_chat_receipt(frappe.safe_decode(chat_id))
+
+
+def send_chat_receipt(chat_id):
+    """Mark a whole chat read and update all its pending messages in one statement."""
+    pipe = frappe.cache().pipeline()
+    pipe.smembers(pending_key(chat_id))
+    pipe.delete(pending_key(chat_id))
+    names, _ = pipe.execute()
+    names = [frappe.safe_decode(name) for name in names]
+    if not names:
+        return
+
+    message_doc = frappe.get_doc("WhatsApp Message", names[0])
+    try:
+        message_doc.make_waha_request("/api/sendSeen", {
+            "session": message_doc.get_session_name(),
+            "chatId": chat_id,
+        })
+    except Exception as e:
+        frappe.log_error("WhatsApp API Error", f"Failed to send read receipt: {str(e)}")
+        retry(chat_id, names)
+        return
+
+    pipe = frappe.cache().pipeline()
+    pipe.hdel(attempts_key(), chat_id)
+    pipe.execute()
+
+    frappe.db.sql(
+        """update `tabWhatsApp Message` set status = 'marked as read'
+        where name in %s and type = 'Incoming'""",
+        (names,),
+    )
+
+    for conversation_id in set(frappe.get_all(
+        "WhatsApp Message", filters={"name": ["in", names]}, pluck="conversation_id"
+    )):
+        mark_read(conversation_id)
+
+    frappe.db.commit()
+
+
+def retry(chat_id, names):
+    """Put a chat whose receipt failed back as pending, with exponential backoff."""
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    pipe.hincrby(attempts_key(), chat_id, 1)
+    (attempts,) = pipe.execute()
+
+    pipe = cache.pipeline()
+    if attempts > MAX_ATTEMPTS:
+        pipe.hdel(attempts_key(), chat_id)
+    else:
+        pipe.sadd(pending_key(chat_id), *names)
+        pipe.zadd(due_key(), {chat_id: time.time() + RETRY_DELAY * 2 ** (attempts - 1)})
+    pipe.execute()
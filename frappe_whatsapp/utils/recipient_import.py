@@ -0,0 +1,401 @@
+"""Streaming import of WhatsApp Recipient rows into recipient lists."""
+import csv
+import json
+import os
+
+import frappe
+from frappe import _
+from frappe.utils import cint, get_files_path, now_datetime
+
+from frappe_whatsapp.utils.phone import normalize_many
+
+IMPORT_CHUNK_SIZE = 2000
+# Imported rows hang off the list under a parentfield that is not a Table field,
+# so loading or saving the list document never touches them
+STORED_PARENTFIELD = "stored_recipients"
+RECIPIENT_FIELDS = ("mobile_number", "recipient_name", "recipient_data", "source_name")
+
+
+def import_from_doctype(list_name, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None, resync=False):
+    """Stream records of `doctype` into a recipient list in keyset chunks.
+
+    A full import replaces the list. With `resync` only new, changed and
+    removed source records touch the stored rows. Returns the number of
+    recipients added or updated.
+    """
+    limit = cint(limit)
+    fields = get_source_fields(doctype, mobile_field, name_field, data_fields)
+    filter_list = as_filter_list(filters)
+    total = frappe.db.count(doctype, filters=filter_list) if not limit else limit
+
+    if not resync:
+        frappe.db.delete("WhatsApp Recipient", {"parent": list_name, "parenttype": "WhatsApp Recipient List"})
+
+    idx = get_last_idx(list_name)
+    imported = 0
+    processed = 0
+    seen = 0
+    last_name = None
+    while not limit or seen < limit:
+        chunk_filters = list(filter_list)
+        if last_name:
+            chunk_filters.append(["name", ">", last_name])
+
+        page_length = min(IMPORT_CHUNK_SIZE, limit - seen) if limit else IMPORT_CHUNK_SIZE
+        records = frappe.get_all(
+            doctype,
+            filters=chunk_filters,
+            fields=["name", *fields],
+            order_by="name asc",
+            limit_page_length=page_length
+        )
+        if not records:
+            break
+
+        seen += len(records)
+        last_name = records[-1].name
+
+        mobiles = normalize_many(record.get(mobile_field) for record in records)
+        rows = [
+            make_recipient(record, mobile, name_field, data_fields)
+            for record, mobile in zip(records, mobiles)
+            if mobile
+        ]
+        if resync:
+            rows = get_changed_rows(list_name, rows)
+
+        idx = insert_recipients(list_name, rows, idx)
+        imported += len(rows)
+        processed += len(records)
+
+        frappe.db.commit()
+        frappe.publish_progress(
+            min(processed * 100 / (total or 1), 100),
+            title=_("Importing Recipients"),
+            doctype="WhatsApp Recipient List",
+            docname=list_name,
+        )
+
+    if resync:
+        remove_stale_rows(list_name, doctype, mobile_field, filter_list)
+
+    frappe.db.set_value("WhatsApp Recipient List", list_name, {
+        "doctype_to_import": doctype,
+        "mobile_field": mobile_field,
+        "name_field": name_field,
+        "import_filters": json.dumps(filters) if filters else None,
+        "import_limit": limit,
+        "data_fields": json.dumps(data_fields) if data_fields else None,
+    })
+    frappe.db.commit()
+
+    return imported
+
+
+def get_source_fields(doctype, mobile_field, name_field=None, data_fields=None):
+    """Columns to read from the source doctype."""
+    fields = [mobile_field]
+    if name_field:
+        fields.append(name_field)
+    if data_fields:
+        meta = frappe.get_meta(doctype)
+        for field in meta.fields:
+            if field.fieldname not in fields and field.fieldname in data_fields:
+                fields.append(field.fieldname)
+    return fields
+
+
+def as_filter_list(filters):
+    """Convert dict filters to a list so keyset conditions can be appended."""
+    if not filters:
+        return []
+
+    if isinstance(filters, dict):
+        return [
+            [key, *value] if isinstance(value, (list, tuple)) else [key, "=", value]
+            for key, value in filters.items()
+        ]
+
+    return list(filters)
+
+
+def make_recipient(record, mobile, name_field=None, data_fields=None):
+    """Build a recipient row from a source record and its normalized number."""
+    recipient_data = {}
+    if data_fields:
+        for field in data_fields:
+            if record.get(field):
+                # Use field name as the variable name in recipient data
+                variable_name = field.lower().replace(" ", "_")
+                recipient_data[variable_name] = record.get(field)
+
+    return {
+        "mobile_number": mobile,
+        "recipient_name": record.get(name_field) if name_field else None,
+        "recipient_data": json.dumps(recipient_data, default=str),
+        "source_name": record.name,
+    }
+
+
+def get_changed_rows(list_name, rows):
+    """Keep rows that are new or differ from the stored row, dropping stale copies."""
+    if not rows:
+        return rows
+
+    existing = {
+        row.source_name: row
+        for row in frappe.get_all(
+            "WhatsApp Recipient",
+            filters={
+                "parent": list_name,
+                "parenttype": "WhatsApp Recipient List",
+                "source_name": ["in", [row["source_name"] for row in rows]],
+            },
+            fields=["name", *RECIPIENT_FIELDS],
+        )
+    }
+
+    changed = []
+    outdated = []
+    for row in rows:
+        stored = existing.get(row["source_name"])
+        if stored and all((stored.get(field) or None) == (row[field] or None) for field in RECIPIENT_FIELDS):
+            continue
+        if stored:
+            outdated.append(stored.name)
+        changed.append(row)
+
+    if outdated:
+        frappe.db.delete("WhatsApp Recipient", {"name": ["in", outdated]})
+
+    return changed
+
+
+def remove_stale_rows(list_name, doctype, mobile_field, filter_list):
+    """Delete rows whose source record was removed or no longer matches the filters."""
+    last_name = None
+    while True:
+        filters = {"parent": list_name, "parenttype": "WhatsApp Recipient List", "source_name": ["is", "set"]}
+        if last_name:
+            filters["name"] = [">", last_name]
+
+        stored = frappe.get_all(
+            "WhatsApp Recipient",
+            filters=filters,
+            fields=["name", "source_name"],
+            order_by="name asc",
+            limit_page_length=IMPORT_CHUNK_SIZE
+        )
+        if not stored:
+            break
+        last_name = stored[-1].name
+
+        matching = {
+            record.name
+            for record in frappe.get_all(
+                doctype,
+                filters=[*filter_list, ["name", "in", [row.source_name for row in stored]]],
+                fields=["name", mobile_field],
+            )
+            if record.get(mobile_field)
+        }
+        stale = [row.name for row in stored if row.source_name not in matching]
+        if stale:
+            frappe.db.delete("WhatsApp Recipient", {"name": ["in", stale]})
+        frappe.db.commit()
+
+
+def get_last_idx(list_name):
+    return cint(frappe.db.sql(
+        """select max(idx) from `tabWhatsApp Recipient`
+        where parent = %s and parenttype = 'WhatsApp Recipient List'""",
+        list_name,
+    )[0][0])
+
+
+def insert_recipients(list_name, rows, idx=0, parentfield=STORED_PARENTFIELD):
+    """Bulk insert recipient rows under a list. Returns the last idx used."""
+    if not rows:
+        return idx
+
+    now = now_datetime()
+    user = frappe.session.user
+    values = []
+    for row in rows:
+        idx += 1
+        values.append((
+            frappe.generate_hash(length=10), now, now, user, user, 0,
+            list_name, "WhatsApp Recipient List", parentfield, idx,
+            *(row.get(field) for field in RECIPIENT_FIELDS),
+        ))
+
+    frappe.db.bulk_insert(
+        "WhatsApp Recipient",
+        fields=[
+            "name", "creation", "modified", "owner", "modified_by", "docstatus",
+            "parent", "parenttype", "parentfield", "idx", *RECIPIENT_FIELDS,
+        ],
+        values=values,
+        chunk_size=IMPORT_CHUNK_SIZE,
+    )
+    return idx
+
+
+def import_from_file(list_name, file_url, mobile_column, name_column=None):
+    """Stream an uploaded CSV or XLSX file into a recipient list.
+
+    The first row is the header. Numbers are normalized and de-duplicated
+    per chunk against the rows already stored, every other column is kept in
+    `recipient_data`. Rejected rows are written to a CSV attached to the list.
+    Returns the number of recipients added.
+    """
+    file_doc = frappe.get_doc("File", {"file_url": file_url})
+    frappe.has_permission("File", "read", file_doc, throw=True)
+    rows = iter_file_rows(file_doc.get_full_path())
+
+    header = [str(column or "").strip() for column in next(rows, [])]
+    if mobile_column not in header:
+        frappe.throw(_("Column {0} not found in the uploaded file").format(mobile_column))
+
+    idx = get_last_idx(list_name)
+    imported = 0
+    rejected = RejectedRows(list_name, header)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= IMPORT_CHUNK_SIZE:
+            idx, added = import_file_batch(list_name, batch, header, mobile_column, name_column, idx, rejected)
+            imported += added
+            batch = []
+
+    if batch:
+        idx, added = import_file_batch(list_name, batch, header, mobile_column, name_column, idx, rejected)
+        imported += added
+
+    rejected.close()
+    frappe.publish_realtime(
+        "whatsapp_recipient_import",
+        {"list_name": list_name, "imported": imported, "rejected": rejected.count, "report": rejected.file_url},
+        user=frappe.session.user,
+    )
+    return imported
+
+
+def iter_file_rows(path):
+    """Yield rows of a CSV or XLSX file without loading the whole file."""
+    if path.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def import_file_batch(list_name, batch, header, mobile_column, name_column, idx, rejected):
+    """Normalize, de-duplicate and insert a batch of file rows. Returns (idx, added)."""
+    mobile_index = header.index(mobile_column)
+    name_index = header.index(name_column) if name_column in header else None
+    data_columns = [
+        (index, column.lower().replace(" ", "_"))
+        for index, column in enumerate(header)
+        if column and index not in (mobile_index, name_index)
+    ]
+
+    mobiles = normalize_mobiles(row[mobile_index] if mobile_index < len(row) else None for row in batch)
+    existing = get_existing_mobiles(list_name, {mobile for mobile in mobiles if mobile})
+
+    recipients = []
+    for row, mobile in zip(batch, mobiles):
+        if not mobile:
+            rejected.add(row, _("Invalid mobile number"))
+            continue
+        if mobile in existing:
+            rejected.add(row, _("Duplicate mobile number"))
+            continue
+
+        existing.add(mobile)
+        recipient_data = {
+            key: row[index] for index, key in data_columns
+            if index < len(row) and row[index] not in (None, "")
+        }
+        recipients.append({
+            "mobile_number": mobile,
+            "recipient_name": row[name_index] if name_index is not None and name_index < len(row) else None,
+            "recipient_data": json.dumps(recipient_data, default=str),
+        })
+
+    idx = insert_recipients(list_name, recipients, idx)
+    frappe.db.commit()
+    return idx, len(recipients)
+
+
+def normalize_mobiles(values):
+    """Normalize a batch of file values to E.164, None for unusable ones."""
+    return normalize_many(
+        # Spreadsheets hand numbers back as floats
+        int(value) if isinstance(value, float) and value.is_integer() else value
+        for value in values
+    )
+
+
+def get_existing_mobiles(list_name, mobiles):
+    """Numbers of `mobiles` that are already stored in the list."""
+    if not mobiles:
+        return set()
+
+    return set(frappe.get_all(
+        "WhatsApp Recipient",
+        filters={
+            "parent": list_name,
+            "parenttype": "WhatsApp Recipient List",
+            "mobile_number": ["in", list(mobiles)],
+        },
+        pluck="mobile_number",
+    ))
+
+
+class RejectedRows:
+    """Write rejected rows to a private CSV as they are found."""
+
+    def __init__(self, list_name, header):
+        self.list_name = list_name
+        self.header = header
+        self.count = 0
+        self.file_url = None
+        self.file_name = f"rejected-recipients-{frappe.generate_hash(length=8)}.csv"
+        self.path = os.path.join(get_files_path(is_private=True), self.file_name)
+        self.file = None
+        self.writer = None
+
+    def add(self, row, reason):
+        if not self.file:
+            self.file = open(self.path, "w", newline="", encoding="utf-8")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow([*self.header, "Reason"])
+
+        self.writer.writerow([*row, reason])
+        self.count += 1
+
+    def close(self):
+        if not self.file:
+            return
+
+        self.file.close()
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": self.file_name,
+            "file_url": f"/private/files/{self.file_name}",
+            "is_private": 1,
+            "attached_to_doctype": "WhatsApp Recipient List",
+            "attached_to_name": self.list_name,
+        })
+        file_doc.flags.ignore_existing_file_check = True
+        file_doc.insert(ignore_permissions=True)
+        frappe.db.commit()
+        self.file_url = file_doc.file_url
@@ -0,0 +1,121 @@
+"""Incremental membership of dynamic recipient lists (segments)."""
+import frappe
+
+from frappe_whatsapp.utils.phone import normalize
+from frappe_whatsapp.utils.recipient_import import (
+    as_filter_list,
+    get_changed_rows,
+    get_source_fields,
+    insert_recipients,
+    make_recipient,
+)
+
+SEGMENT_MAP_KEY = "whatsapp_segment_map"
+
+
+def get_segment_map():
+    """Get dynamic segments grouped by source doctype."""
+    return frappe.cache().get_value(SEGMENT_MAP_KEY, generator=build_segment_map)
+
+
+def build_segment_map():
+    if not frappe.db.table_exists("WhatsApp Recipient List"):
+        return {}
+
+    segment_map = {}
+    for segment in frappe.get_all(
+        "WhatsApp Recipient List",
+        filters={"is_dynamic": 1, "import_from_doctype": 1},
+        fields=["name", "doctype_to_import", "mobile_field", "name_field", "import_filters", "data_fields"],
+    ):
+        if not segment.doctype_to_import or not segment.mobile_field:
+            continue
+
+        segment_map.setdefault(segment.doctype_to_import, []).append({
+            "name": segment.name,
+            "mobile_field": segment.mobile_field,
+            "name_field": segment.name_field,
+            "filters": frappe.parse_json(segment.import_filters) or None,
+            "data_fields": frappe.parse_json(segment.data_fields) or None,
+        })
+
+    return segment_map
+
+
+def clear_segment_map():
+    frappe.cache().delete_value(SEGMENT_MAP_KEY)
+
+
+def update_segment_membership(doc, method=None):
+    """Add, refresh or drop `doc` in every dynamic segment built from its doctype."""
+    if frappe.flags.in_install or frappe.flags.in_migrate or frappe.flags.in_uninstall:
+        return
+
+    segments = get_segment_map().get(doc.doctype)
+    if not segments:
+        return
+
+    for segment in segments:
+        try:
+            if method == "on_trash":
+                remove_member(segment["name"], doc.name)
+            else:
+                sync_member(segment, doc)
+        except Exception:
+            frappe.log_error(
+                f"WhatsApp Segment Error: {segment['name']}",
+                f"Error updating segment for {doc.doctype} {doc.name}\n\n{frappe.get_traceback()}"
+            )
+
+
+def sync_member(segment, doc):
+    """Re-evaluate one source record against the segment filters."""
+    fields = get_source_fields(doc.doctype, segment["mobile_field"], segment["name_field"], segment["data_fields"])
+    record = frappe.get_all(
+        doc.doctype,
+        filters=[*as_filter_list(segment["filters"]), ["name", "=", doc.name]],
+        fields=["name", *fields],
+        limit_page_length=1,
+    )
+    mobile = normalize(record[0].get(segment["mobile_field"])) if record else None
+    if not mobile:
+        remove_member(segment["name"], doc.name)
+        return
+
+    row = make_recipient(record[0], mobile, segment["name_field"], segment["data_fields"])
+    rows = get_changed_rows(segment["name"], [row])
+    # Member order does not matter, skip the max(idx) scan over the whole segment
+    insert_recipients(segment["name"], rows)
+
+
+def remove_member(list_name, source_name):
+    frappe.db.delete("WhatsApp Recipient", {
+        "parent": list_name,
+        "parenttype": "WhatsApp Recipient List",
+        "source_name": source_name,
+    })
+
+
+def resync_segments():
+    """Nightly catch-up for changes that bypassed document events."""
+    for segments in get_segment_map().values():
+        for segment in segments:
+            enqueue_segment_sync(segment["name"], resync=True)
+
+
+def enqueue_segment_sync(list_name, resync=False):
+    doc = frappe.get_doc("WhatsApp Recipient List", list_name)
+    frappe.enqueue(
+        "frappe_whatsapp.utils.recipient_import.import_from_doctype",
+        queue="long",
+        timeout=6 * 3600,
+        job_id=f"whatsapp_segment_sync|{list_name}",
+        deduplicate=True,
+        list_name=list_name,
+        doctype=doc.doctype_to_import,
+        mobile_field=doc.mobile_field,
+        name_field=doc.name_field,
+        filters=frappe.parse_json(doc.import_filters) or None,
+        data_fields=frappe.parse_json(doc.data_fields) or None,
+        resync=resync,
+    )
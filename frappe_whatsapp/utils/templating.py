@@ -0,0 +1,76 @@
+"""Compiled {{variable}} templates for personalized bulk messages."""
+import json
+import re
+from functools import lru_cache
+
+import frappe
+
+PLACEHOLDER = re.compile(r"\{\{\s*([^{}\s]+)\s*\}\}")
+UNDEFINED_SAMPLE_SIZE = 1000
+
+
+@lru_cache(maxsize=128)
+def compile_template(text):
+    """Split `text` into a plan of literal strings and variable names.
+
+    Even positions of the plan are literals, odd positions are variables.
+    """
+    return tuple(PLACEHOLDER.split(text or ""))
+
+
+def get_variables(text):
+    """Names of the variables used in `text`, in first use order."""
+    return list(dict.fromkeys(compile_template(text)[1::2]))
+
+
+def render(plan, variables):
+    """Render a compiled plan. Unknown variables are left as they were written."""
+    if len(plan) == 1:
+        return plan[0]
+
+    parts = list(plan)
+    for i in range(1, len(parts), 2):
+        value = variables.get(parts[i])
+        parts[i] = "{{" + parts[i] + "}}" if value is None else str(value)
+    return "".join(parts)
+
+
+def render_many(text, recipients):
+    """Render `text` for a chunk of recipients, parsing each `recipient_data` once."""
+    plan = compile_template(text)
+    if len(plan) == 1:
+        return [plan[0]] * len(recipients)
+
+    messages = []
+    invalid = 0
+    for recipient in recipients:
+        try:
+            variables = json.loads(recipient.get("recipient_data") or "{}")
+        except ValueError:
+            variables = {}
+            invalid += 1
+        messages.append(render(plan, variables if isinstance(variables, dict) else {}))
+
+    if invalid:
+        frappe.log_error(
+            "WhatsApp Bulk Messaging",
+            f"{invalid} recipients have invalid recipient data, their variables were not replaced"
+        )
+
+    return messages
+
+
+def find_undefined_variables(text, recipients):
+    """Variables of `text` that none of `recipients` defines."""
+    undefined = set(get_variables(text))
+    for recipient in recipients:
+        if not undefined:
+            break
+        try:
+            variables = json.loads(recipient.get("recipient_data") or "{}")
+        except ValueError:
+            continue
+        if isinstance(variables, dict):
+            undefined -= variables.keys()
+
+    return [variable for variable in get_variables(text) if variable in undefined]
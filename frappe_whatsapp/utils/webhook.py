@@ -7,6 +7,9 @@ import hashlib
 from werkzeug.wrappers import Response
 import frappe.utils
 
+from frappe_whatsapp.utils import read_receipts
+from frappe_whatsapp.utils.log_writer import log
+
 
 @frappe.whitelist(allow_guest=True)
 def webhook():
@@ -47,11 +50,7 @@ def post():
 	
 	data = frappe.local.form_dict
 	
-	frappe.get_doc({
-		"doctype": "WhatsApp Notification Log",
-		"template": "Webhook",
-		"meta_data": json.dumps(data)
-	}).insert(ignore_permissions=True)
+	log("Webhook", data)
 	
 	event = data.get("event")
 	payload = data.get("payload", {})
@@ -78,6 +77,9 @@ def handle_message(message, session):
 	if message.get("fromMe"):
 		return
 	
+	if is_duplicate(message.get("id")):
+		return
+	
 	message_type = get_message_type(message)
 	message_body = get_message_body(message, message_type)
 	
@@ -106,7 +108,7 @@ def handle_message(message, session):
 		else:
 			message_doc.insert(ignore_permissions=True)
 			if should_send_read_receipt():
-				message_doc.send_read_receipt()
+				read_receipts.schedule(message_doc, message.get("from"))
 	except Exception as e:
 		frappe.log_error(
 			"WhatsApp Message Insert Failed",
@@ -114,6 +116,11 @@ def handle_message(message, session):
 		)
 
 
+def is_duplicate(message_id):
+	"""Check whether a redelivered webhook event was already stored."""
+	return bool(message_id) and frappe.db.exists("WhatsApp Message", {"message_id": message_id})
+
+
 def get_message_type(message):
 	"""Determine message type from WAHA message payload."""
 	if message.get("body"):
@@ -194,7 +201,7 @@ def handle_media_message(message, message_doc, message_type):
 		message_doc.save()
 		
 		if should_send_read_receipt():
-			message_doc.send_read_receipt()
+			read_receipts.schedule(message_doc, message.get("from"))
 	
 	except Exception as e:
 		frappe.log_error("WAHA Media Download Error", str(e))
@@ -234,6 +241,9 @@ def get_file_extension(mime_type, message_type):
 
 def handle_reaction(payload, session):
 	"""Handle reaction event."""
+	if is_duplicate(payload.get("id")):
+		return
+	
 	reaction = payload.get("reaction", {})
 	from_number = payload.get("from", "").replace("@c.us", "")
 	